@@ -2,165 +2,175 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-import json
+import hashlib
+import os
+import click
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import (Flask, Blueprint, render_template, request, Response,
+                   flash, redirect, url_for, abort, jsonify,
+                   stream_with_context, current_app, session, make_response)
+from flask.cli import with_appcontext
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
-from datetime import datetime
+from flask_migrate import Migrate
+from itertools import groupby
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
 from forms import *
+from models import (db, Venue, Artist, Show, touch, venue_search,
+                    artist_search, venue_genres, artist_genres)
+from ical import iter_calendar
+from export import export
+import booking
+import counters
+from pagination import paginate
+from cache import PageCache
+from formatting import format_datetime
+from bulk_import import VenueImporter, ArtistImporter, ShowImporter
+from instrumentation import SQLInstrumentation
+from assets import Assets, build as build_assets
 # ----------------------------------------------------------------------------#
-# App Config.
+# Extensions.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# Created unbound and initialized in create_app(), so importing this module
+# neither connects to the database nor builds an application.
+moment = Moment()
+migrate = Migrate()
+instrumentation = SQLInstrumentation()
+assets = Assets()
+page_cache = PageCache()
 
-# TODO: connect to a local postgresql database
+# Every controller, filter and error handler below is registered on this
+# blueprint; its endpoints are named "main.<view>".
+bp = Blueprint('main', __name__)
 
 # ----------------------------------------------------------------------------#
-# Models.
+# Filters.
 # ----------------------------------------------------------------------------#
 
 
-class Venue(db.Model):
-    __tablename__ = 'Venue'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    address = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    shows = db.relationship('Show', backref='venue', lazy=True)
-    genres = db.Column(db.ARRAY(db.String()))
-
-    @property
-    def past_shows(self):
-        now = datetime.now()
-        past_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') < now]
-        return past_shows
+bp.add_app_template_filter(format_datetime, 'datetime')
 
-    @property
-    def upcoming_shows(self):
-        now = datetime.now()
-        future_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') > now]
-        return future_shows
+# ----------------------------------------------------------------------------#
+# Pagination.
+# ----------------------------------------------------------------------------#
 
-    @property
-    def past_shows_count(self):
-        return len(self.past_shows)
 
-    @property
-    def upcoming_shows_count(self):
-        return len(self.upcoming_shows)
+def paginate_listing(query, keys):
+    # pages the listing after ?cursor= with ?per_page= rows (capped by
+    # MAX_PAGE_SIZE); a cursor from another listing is a bad request.
+    per_page = request.args.get(
+        'per_page', current_app.config['PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+    try:
+        return paginate(query, keys, request.args.get('cursor'), per_page)
+    except ValueError:
+        abort(400)
 
-    # TODO: implement any missing fields, as a database migration using
-    # Flask-Migrate
 
+def listing_order(model, keys):
+    # ?sort=popular puts the entities with the most upcoming shows first.
+    if request.args.get('sort') == 'popular':
+        return [(model.upcoming_shows_count, True)] + keys
+    return keys
 
-class Artist(db.Model):
-    __tablename__ = 'Artist'
 
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    shows = db.relationship('Show', backref='artist', lazy=True)
-    genres = db.Column(db.ARRAY(db.String()))
+def popularity_filter(model):
+    # ?min_upcoming=N keeps entities with at least N upcoming shows.
+    minimum = request.args.get('min_upcoming', type=int)
+    if minimum is None:
+        return []
+    return [model.upcoming_shows_count >= minimum]
 
-    @property
-    def past_shows(self):
-        now = datetime.now()
-        past_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') < now]
-        return past_shows
 
-    @property
-    def upcoming_shows(self):
-        now = datetime.now()
-        future_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') > now]
-        return future_shows
+@bp.app_template_global()
+def page_url(cursor):
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    args.update(request.view_args)
+    return url_for(request.endpoint, **args)
 
-    @property
-    def past_shows_count(self):
-        return len(self.past_shows)
 
-    @property
-    def upcoming_shows_count(self):
-        return len(self.upcoming_shows)
+def wants_json():
+    best = request.accept_mimetypes.best_match(
+        ['text/html', 'application/json'])
+    return best == 'application/json'
 
 
-class Show(db.Model):
-    __tablename__ = 'Show'
+def page_json(page, data):
+    return jsonify({
+        "data": data,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor
+    })
 
-    id = db.Column(db.Integer, primary_key=True)
+# ----------------------------------------------------------------------------#
+# Related pages.
+# ----------------------------------------------------------------------------#
 
-    venue_id = db.Column(db.Integer, db.ForeignKey(
-        'Venue.id'), nullable=False)
+# A venue page shows the artists of its shows, and an artist page the name
+# and image of every venue it plays at, so editing one touches the other.
 
-    artist_id = db.Column(db.Integer, db.ForeignKey(
-        'Artist.id'), nullable=False)
 
-    start_time = db.Column(db.String(), nullable=False)
+def venue_artist_ids(venue_id):
+    return [artist_id for (artist_id,) in db.session.query(
+        Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
 
-    @property
-    def artist_name(self):
-        return Artist.query.get(self.artist_id).name
 
-    @property
-    def artist_image_link(self):
-        return Artist.query.get(self.artist_id).image_link
+def artist_venue_ids(artist_id):
+    return [venue_id for (venue_id,) in db.session.query(
+        Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
 
-    @property
-    def venue_name(self):
-        return Venue.query.get(self.venue_id).name
-
-    @property
-    def venue_image_link(self):
-        return Venue.query.get(self.venue_id).image_link
-
-
-db.create_all()
 # ----------------------------------------------------------------------------#
-# Filters.
+# Conditional GET.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
-
-
-app.jinja_env.filters['datetime'] = format_datetime
+def page_version(app):
+    # Entity pages are also a function of the templates and the asset
+    # manifest, so a deploy that changes either changes every ETag.
+    digest = hashlib.sha1()
+    paths = [os.path.join(app.static_folder, 'dist', 'manifest.json')]
+    for root, _, files in os.walk(
+            os.path.join(app.root_path, app.template_folder)):
+        paths.extend(os.path.join(root, name) for name in files)
+    for path in sorted(paths):
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+    return digest.hexdigest()[:12]
+
+
+def conditional_page(kind, model, id, render):
+    # Answers If-None-Match from the row's updated_at alone, before any
+    # template is rendered. The rendered page is cached under the same
+    # ETag, so a body is only ever sent with the validator of the version
+    # it was rendered from. Pages carrying flashed messages are one-offs
+    # and are rendered afresh and sent without a validator.
+    updated_at = db.session.query(model.updated_at).filter(
+        model.id == id).scalar()
+    if updated_at is None:
+        abort(404)
+    if session.get('_flashes'):
+        return render()
+    etag = '{}-{}-{:%Y%m%d%H%M%S%f}-{}'.format(
+        kind, id, updated_at, current_app.config['PAGE_VERSION'])
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(page_cache.render(etag, render))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -168,26 +178,47 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@bp.route('/venues')
+@db.read_only
 def venues():
-    # TODO: replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per
-    # venue.
-    data = Venue.query.all()
-    # create a list of cities
-    cities = [(d.city, d.state) for d in data]
-    cities = set(cities)
-    return render_template('pages/venues.html', cities=cities, venues=data)
-
-
-@app.route('/venues/search', methods=['POST'])
+    # venues come with their maintained upcoming show count, ordered so
+    # that venues of the same area are adjacent (most popular first within
+    # an area with ?sort=popular).
+    query = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count,
+    ).filter(*popularity_filter(Venue))
+    page = paginate_listing(query, [Venue.city, Venue.state] + listing_order(
+        Venue, [Venue.name, Venue.id]))
+    areas = [{
+        "city": city,
+        "state": state,
+        "venues": [{
+            "id": venue.id,
+            "name": venue.name,
+            "num_upcoming_shows": venue.upcoming_shows_count
+        } for venue in venues]
+    } for (city, state), venues in groupby(
+        page, key=lambda venue: (venue.city, venue.state))]
+    if wants_json():
+        return page_json(page, areas)
+    return render_template('pages/venues.html', areas=areas, page=page)
+
+
+@bp.route('/venues/search', methods=['POST'])
+@db.read_only
 def search_venues():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # TODO: implement search on artists with partial string search. Ensure
+    # it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live
     # Music & Coffee"
-    venues = Venue.query.filter(func.lower(Venue.name).contains(
-        request.form.get('search_term').lower())).all()
+    venues = venue_search.search(
+        request.form.get('search_term', ''),
+        limit=current_app.config['SEARCH_RESULTS_LIMIT'])
     count = len(venues)
     response = {
         "count": count,
@@ -201,24 +232,29 @@ def search_venues():
             ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@bp.route('/venues/<int:venue_id>')
+@db.read_only
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
-    venue = Venue.query.get(venue_id)
-    return render_template('pages/show_venue.html', venue=venue)
+    def render():
+        venue = Venue.query.get(venue_id)
+        if venue is None:
+            abort(404)
+        return render_template('pages/show_venue.html', venue=venue)
+    return conditional_page('venue', Venue, venue_id, render)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
@@ -253,16 +289,17 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit
     # could fail.
 
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the
-    # homepage
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page,
+    # have it so that clicking that button delete it from the db then
+    # redirect the user to the homepage
     try:
+        Show.delete_where(Show.venue_id == venue_id)
         Venue.query.filter_by(id=venue_id).delete()
         db.session.commit()
         flash('Venue was successfully deleted!')
@@ -278,21 +315,32 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@bp.route('/artists')
+@db.read_only
 def artists():
-    # TODO: replace with real data returned from querying the database
-    data = Artist.query.all()
-    return render_template('pages/artists.html', artists=data)
-
-
-@app.route('/artists/search', methods=['POST'])
+    page = paginate_listing(
+        Artist.query.filter(*popularity_filter(Artist)),
+        listing_order(Artist, [Artist.name, Artist.id]))
+    if wants_json():
+        return page_json(page, [{
+            "id": artist.id,
+            "name": artist.name,
+            "num_upcoming_shows": artist.upcoming_shows_count
+        } for artist in page])
+    return render_template('pages/artists.html', artists=page, page=page)
+
+
+@bp.route('/artists/search', methods=['POST'])
+@db.read_only
 def search_artists():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # TODO: implement search on artists with partial string search. Ensure
+    # it is case-insensitive.
+    # seach for "A" should return "Guns N Petals", "Matt Quevado", and
+    # "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    artists = Artist.query.filter(func.lower(Artist.name).contains(
-        request.form.get('search_term').lower())).all()
-
+    artists = artist_search.search(
+        request.form.get('search_term', ''),
+        limit=current_app.config['SEARCH_RESULTS_LIMIT'])
     count = len(artists)
     response = {
         "count": count,
@@ -306,18 +354,23 @@ def search_artists():
             ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
+@db.read_only
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
-    data = Artist.query.get(artist_id)
-    return render_template('pages/show_artist.html', artist=data)
+    def render():
+        data = Artist.query.get(artist_id)
+        if data is None:
+            abort(404)
+        return render_template('pages/show_artist.html', artist=data)
+    return conditional_page('artist', Artist, artist_id, render)
 
 #  Update
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     form = ArtistForm()
     artist = Artist.query.get(artist_id)
@@ -332,7 +385,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
@@ -345,6 +398,8 @@ def edit_artist_submission(artist_id):
         artist.genres = [data['genres']]
         artist.phone = data['phone']
         artist.facebook_link = data['facebook_link']
+        venue_ids = artist_venue_ids(artist_id)
+        touch(Venue, venue_ids)
         db.session.commit()
         flash('Artist ' + request.form['name'] + ' was successfully edited!')
     except BaseException:
@@ -354,10 +409,10 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     form = VenueForm()
     venue = Venue.query.get(venue_id)
@@ -373,7 +428,7 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
@@ -387,6 +442,8 @@ def edit_venue_submission(venue_id):
         venue.phone = data['phone']
         venue.address = data['address']
         venue.facebook_link = data['facebook_link']
+        artist_ids = venue_artist_ids(venue_id)
+        touch(Artist, artist_ids)
         db.session.commit()
         flash('Venue ' + request.form['name'] + ' was successfully edited!')
     except BaseException:
@@ -396,19 +453,19 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
@@ -443,30 +500,149 @@ def create_artist_submission():
 
     return render_template('pages/home.html')
 
+#  Genres
+#  ----------------------------------------------------------------
+
+
+@bp.route('/genres')
+@db.read_only
+def genres():
+    facets = {
+        "venues": [{"genre": genre, "count": count}
+                   for genre, count in venue_genres.facets()],
+        "artists": [{"genre": genre, "count": count}
+                    for genre, count in artist_genres.facets()]
+    }
+    if wants_json():
+        return jsonify(facets)
+    return render_template('pages/genres.html', facets=facets)
+
+
+@bp.route('/genres/<genre>/venues')
+@db.read_only
+def genre_venues(genre):
+    page = paginate_listing(venue_genres.browse(genre), [Venue.name, Venue.id])
+    if wants_json():
+        return page_json(page, [{
+            "id": venue.id,
+            "name": venue.name,
+            "city": venue.city,
+            "state": venue.state
+        } for venue in page])
+    return render_template('pages/genre.html', genre=genre, kind='venues',
+                           items=page, page=page)
+
+
+@bp.route('/genres/<genre>/artists')
+@db.read_only
+def genre_artists(genre):
+    page = paginate_listing(artist_genres.browse(genre),
+                            [Artist.name, Artist.id])
+    if wants_json():
+        return page_json(page, [{
+            "id": artist.id,
+            "name": artist.name,
+            "city": artist.city,
+            "state": artist.state
+        } for artist in page])
+    return render_template('pages/genre.html', genre=genre, kind='artists',
+                           items=page, page=page)
+
 #  Shows
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows')
+def show_window():
+    # ?from= (inclusive) and ?to= (exclusive) bound the show start time.
+    criteria = []
+    try:
+        if request.args.get('from'):
+            criteria.append(
+                Show.start_time >= dateutil.parser.parse(request.args['from']))
+        if request.args.get('to'):
+            criteria.append(
+                Show.start_time < dateutil.parser.parse(request.args['to']))
+    except (ValueError, OverflowError):
+        abort(400)
+    return criteria
+
+
+def show_listing(*criterion):
+    page = paginate_listing(Show.listing(*(show_window() + list(criterion))),
+                            [Show.start_time, Show.id])
+    if wants_json():
+        return page_json(page, [{
+            "venue_id": show.venue_id,
+            "venue_name": show.venue_name,
+            "artist_id": show.artist_id,
+            "artist_name": show.artist_name,
+            "artist_image_link": show.artist_image_link,
+            "start_time": show.start_time.isoformat()
+        } for show in page])
+    return render_template('pages/shows.html', shows=page, page=page)
+
+
+def show_calendar(name, filename, *criterion):
+    # streams the events as they are read, in batches, from a server-side
+    # cursor instead of building the document in memory.
+    shows = Show.listing(*(show_window() + list(criterion))).order_by(
+        Show.start_time, Show.id).execution_options(
+        stream_results=True).yield_per(500)
+    return Response(
+        stream_with_context(iter_calendar(shows, name)),
+        mimetype='text/calendar',
+        headers={'Content-Disposition':
+                 'attachment; filename={}.ics'.format(filename)})
+
+
+@bp.route('/shows')
+@db.read_only
 def shows():
-    # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per
-    # venue.
-    data = Show.query.all()
-    return render_template('pages/shows.html', shows=data)
+    # displays list of shows at /shows, optionally within ?from=&to=
+    return show_listing()
+
+
+@bp.route('/venues/<int:venue_id>/calendar')
+@db.read_only
+def venue_calendar(venue_id):
+    Venue.query.get_or_404(venue_id)
+    return show_listing(Show.venue_id == venue_id)
+
+
+@bp.route('/venues/<int:venue_id>/calendar.ics')
+@db.read_only
+def venue_calendar_ics(venue_id):
+    venue = Venue.query.get_or_404(venue_id)
+    return show_calendar(venue.name, 'venue-{}'.format(venue_id),
+                         Show.venue_id == venue_id)
+
 
+@bp.route('/artists/<int:artist_id>/calendar')
+@db.read_only
+def artist_calendar(artist_id):
+    Artist.query.get_or_404(artist_id)
+    return show_listing(Show.artist_id == artist_id)
 
-@app.route('/shows/create')
+
+@bp.route('/artists/<int:artist_id>/calendar.ics')
+@db.read_only
+def artist_calendar_ics(artist_id):
+    artist = Artist.query.get_or_404(artist_id)
+    return show_calendar(artist.name, 'artist-{}'.format(artist_id),
+                         Show.artist_id == artist_id)
+
+
+@bp.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
-    # called to create new shows in the db, upon submitting new show listing form
+    # called to create new shows in the db, upon submitting new show listing
+    # form
     # TODO: insert form data as a new Show record in the db, instead
 
     # on successful db insert, flash success
@@ -476,8 +652,20 @@ def create_show_submission():
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
     try:
         data = request.form
-        show = Show(artist_id=data['artist_id'],
-                    venue_id=data['venue_id'], start_time=data['start_time'])
+        start_time = dateutil.parser.parse(data['start_time'])
+        end_time = data.get('end_time')
+        show = Show(artist_id=int(data['artist_id']),
+                    venue_id=int(data['venue_id']),
+                    start_time=start_time,
+                    end_time=booking.show_end(
+                        start_time,
+                        dateutil.parser.parse(end_time) if end_time else None))
+        if booking.conflicts(db.session.connection(), Show.__table__, [{
+                'venue_id': show.venue_id, 'artist_id': show.artist_id,
+                'start_time': show.start_time, 'end_time': show.end_time}]):
+            flash('An error occurred. The venue or artist is already booked '
+                  'at that time.')
+            return render_template('pages/home.html')
         db.session.add(show)
         db.session.commit()
         flash('The show was successfully created!')
@@ -490,24 +678,168 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+#  Export
+#  ----------------------------------------------------------------
+
+EXPORT_COLUMNS = {
+    'venues': (Venue, ('id', 'name', 'city', 'state', 'address', 'phone',
+                       'image_link', 'facebook_link', 'genres')),
+    'artists': (Artist, ('id', 'name', 'city', 'state', 'phone',
+                         'image_link', 'facebook_link', 'genres')),
+    'shows': (Show, ('id', 'venue_id', 'artist_id', 'start_time',
+                     'end_time')),
+}
+
+
+def export_query(table):
+    model, columns = EXPORT_COLUMNS[table]
+    query = db.session.query(
+        *[getattr(model, column) for column in columns]).order_by(model.id)
+    return query, columns
+
+
+@bp.route(
+    '/export/<any(venues, artists, shows):table>.<any(csv, json):format>')
+@bp.route(
+    '/export/<any(venues, artists, shows):table>.<any(csv, json):format>.gz',
+    defaults={'compress': True})
+@db.read_only
+def export_table(table, format, compress=False):
+    query, columns = export_query(table)
+    chunks, mimetype = export(query, columns, format, compress)
+    filename = '{}.{}{}'.format(table, format, '.gz' if compress else '')
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition':
+                 'attachment; filename={}'.format(filename)})
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the tables and search/genre indexes of an empty database."""
+    # A fresh database (or a local sqlite file) is created from the models;
+    # an existing postgres database is brought up to date with
+    # `flask db upgrade` instead. Neither happens when the app starts.
+    db.create_all()
+    click.echo('Created the schema in {}'.format(db.engine.url))
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Rows inserted per batch.')
+@with_appcontext
+def import_command(kind, path, chunk_size):
+    """Bulk load venues, artists or shows from a CSV, JSON or JSONL file."""
+    def progress(stats):
+        click.echo('{}: {}'.format(kind, stats))
+
+    options = {'chunk_size': chunk_size, 'progress': progress}
+    if kind == 'venues':
+        importer = VenueImporter(db, Venue.__table__, **options)
+    elif kind == 'artists':
+        importer = ArtistImporter(db, Artist.__table__, **options)
+    else:
+        importer = ShowImporter(db, Show.__table__, Venue.__table__,
+                                Artist.__table__, **options)
+    stats = importer.run(path)
+    click.echo('Done: {}'.format(stats))
+
+
+@click.command('export')
+@click.argument('table', type=click.Choice(['venues', 'artists', 'shows']))
+@click.option('--format', 'format', type=click.Choice(['csv', 'json']),
+              default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True,
+              help='Gzip the output as it is written.')
+@click.option('--output', '-o', type=click.File('wb'), default='-',
+              help='Output file (default: stdout).')
+@with_appcontext
+def export_command(table, format, compress, output):
+    """Stream a table to a CSV or JSON file in constant memory."""
+    query, columns = export_query(table)
+    chunks, _ = export(query, columns, format, compress)
+    for chunk in chunks:
+        output.write(chunk)
+
+
+@click.command('rollover-shows')
+@with_appcontext
+def rollover_command():
+    """Move shows that have started from the upcoming to the past counts."""
+    # Run it every minute or so (cron, a systemd timer); counts lag real
+    # time by at most that interval.
+    with db.engine.connect() as conn:
+        moved = counters.rollover(conn, Show.__table__, Venue.__table__,
+                                  Artist.__table__)
+    click.echo('Moved {} shows to past'.format(moved))
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress the static files for long-lived caching."""
+    manifest = build_assets(current_app.static_folder)
+    click.echo('Built {} assets into {}'.format(
+        len(manifest), assets.directory))
+
+# ----------------------------------------------------------------------------#
+# App Config.
+# ----------------------------------------------------------------------------#
+
+
+def create_app(config='config'):
+    """
+    Builds the application. Extensions are bound here and the database is
+    only connected to when a request or command first needs it.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.setdefault('PAGE_VERSION', page_version(app))
+
+    moment.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    instrumentation.init_app(app)
+    assets.init_app(app)
+    page_cache.init_app(app)
+    app.register_blueprint(bp)
+
+    for command in (init_db_command, import_command, export_command,
+                    rollover_command, build_assets_command):
+        app.cli.add_command(command)
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(Formatter(
+            '%(asctime)s %(levelname)s: %(message)s '
+            '[in %(pathname)s:%(lineno)d]'))
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -515,11 +847,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
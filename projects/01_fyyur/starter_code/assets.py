@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+# Fingerprinted copies, their compressed variants and the manifest are
+# written under <static>/BUILD_DIR by `flask build-assets`.
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Fingerprinted URLs never change content, so browsers may keep them a year
+# without revalidating.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html',
+                '.eot', '.ttf', '.otf')
+
+# Variants in order of preference: (Content-Encoding, file suffix).
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _hashed_name(path, digest):
+    root, ext = posixpath.splitext(path)
+    return '{}.{}{}'.format(root, digest[:12], ext)
+
+
+def _rewrite_css(text, path, manifest):
+    '''
+    Points relative url() references in a stylesheet at the fingerprinted
+    copies, or back at the original files for assets that were not built.
+    '''
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, url = match.groups()
+        if re.match(r'^([a-z]+:|/|#)', url, re.I):
+            return match.group(0)
+        target, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        resolved = posixpath.normpath(posixpath.join(directory, target))
+        if resolved in manifest:
+            url = posixpath.relpath(manifest[resolved], directory) + suffix
+        else:
+            url = posixpath.join('..', url)
+        return 'url({0}{1}{0})'.format(quote, url)
+
+    return CSS_URL.sub(replace, text)
+
+
+def _compress(path, data):
+    written = []
+    variants = [('.gz', gzip.compress(data, 9))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        # small or already compressed files are not worth a variant
+        if len(compressed) < len(data) * 0.9:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(suffix)
+    return written
+
+
+def build(static_folder):
+    '''
+    Copies every static file to <static>/dist under a content-hashed name,
+    writes .gz (and, with the brotli package, .br) variants of text assets
+    and a manifest mapping each original path to its fingerprinted one.
+    Stylesheets are built last so their url() references can be rewritten.
+    '''
+    output = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(output, ignore_errors=True)
+
+    paths = []
+    for directory, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(
+            d for d in dirs if os.path.join(directory, d) != output)
+        for name in sorted(files):
+            full = os.path.join(directory, name)
+            paths.append(os.path.relpath(full, static_folder).replace(
+                os.sep, '/'))
+    paths.sort(key=lambda path: path.endswith('.css'))
+
+    manifest = {}
+    for path in paths:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css(
+                data.decode('utf-8'), path, manifest).encode('utf-8')
+        hashed = _hashed_name(path, hashlib.sha256(data).hexdigest())
+        target = os.path.join(output, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        if path.lower().endswith(COMPRESSIBLE):
+            _compress(target, data)
+        manifest[path] = hashed
+
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+    '''
+    Serves the output of `build()`: url_for('static', filename=...) emits the
+    fingerprinted URL of any file in the manifest, and fingerprinted files
+    are sent precompressed when the client accepts it, with immutable cache
+    headers. Without a manifest static files are served as before.
+    '''
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = os.path.join(app.static_folder, BUILD_DIR)
+        self.manifest = {}
+        path = os.path.join(self.directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+        app.url_defaults(self.fingerprint)
+        app.view_functions['static'] = self.serve
+
+    def fingerprint(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = posixpath.join(
+                BUILD_DIR, self.manifest[values['filename']])
+
+    def serve(self, filename):
+        prefix = BUILD_DIR + '/'
+        if not filename.startswith(prefix) or filename.endswith(MANIFEST):
+            return current_app.send_static_file(filename)
+        filename = filename[len(prefix):]
+        mimetype = mimetypes.guess_type(filename)[0]
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            if accepted[encoding] and os.path.isfile(
+                    os.path.join(self.directory, filename + suffix)):
+                response = send_from_directory(
+                    self.directory, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(
+                self.directory, filename, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
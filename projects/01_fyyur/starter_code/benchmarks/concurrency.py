@@ -0,0 +1,167 @@
+'''
+Concurrent throughput of Fyyur's read routes against a slow database.
+
+Seeds a temporary sqlite database, then serves the app from one process in
+each --mode and drives the listing, detail and search routes with
+--concurrency simultaneous clients. Every SQL statement is delayed by
+--delay seconds to stand in for a remote or overloaded database:
+
+  sync      one request at a time, like a gunicorn sync worker
+  threaded  a thread per request
+  gevent    cooperative greenlets (GUNICORN_WORKER_CLASS=gevent, green.py)
+
+    $ python benchmarks/concurrency.py
+    $ python benchmarks/concurrency.py --delay 0.05 --concurrency 100
+
+gevent must be installed for the gevent mode.
+'''
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from routes import WORDS, percentile, seed  # noqa: E402
+
+
+def serve(mode, port, delay):
+    if mode == 'gevent':
+        from green import patch
+        patch()
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def slow_database(*args):
+        time.sleep(delay)
+
+    app = create_app()
+    if mode == 'gevent':
+        from gevent.pywsgi import WSGIServer
+        WSGIServer(('127.0.0.1', port), app, log=None).serve_forever()
+    else:
+        import logging
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        make_server('127.0.0.1', port, app,
+                    threaded=mode == 'threaded').serve_forever()
+
+
+def requests_for(venues, artists, rnd):
+    while True:
+        yield rnd.choice([
+            ('/venues', None),
+            ('/artists', None),
+            ('/shows', None),
+            ('/venues/{}'.format(rnd.randint(1, venues)), None),
+            ('/artists/{}'.format(rnd.randint(1, artists)), None),
+            ('/venues/search', {'search_term': rnd.choice(WORDS)}),
+            ('/artists/search', {'search_term': rnd.choice(WORDS)}),
+        ])
+
+
+def fetch(base, path, form):
+    data = urllib.parse.urlencode(form).encode() if form else None
+    started = time.perf_counter()
+    with urllib.request.urlopen(base + path, data=data, timeout=120) as r:
+        r.read()
+    return time.perf_counter() - started
+
+
+def wait_until_up(base, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited with {}'.format(
+                process.returncode))
+        try:
+            urllib.request.urlopen(base + '/', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def run(mode, args, env, port):
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode,
+         '--port', str(port), '--delay', str(args.delay)], env=env)
+    base = 'http://127.0.0.1:{}'.format(port)
+    try:
+        wait_until_up(base, process)
+        work = requests_for(args.venues, args.artists,
+                            random.Random(args.seed))
+        jobs = [next(work) for _ in range(args.requests)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            latencies = list(pool.map(lambda job: fetch(base, *job), jobs))
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        'rps': len(jobs) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fyyur concurrent read throughput with a slow database.')
+    parser.add_argument('--mode', action='append',
+                        choices=['sync', 'threaded', 'gevent'])
+    parser.add_argument('--delay', type=float, default=0.02,
+                        help='seconds added to every SQL statement')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port, args.delay)
+
+    tmpdir = tempfile.mkdtemp(prefix='fyyur-bench-')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(tmpdir, 'bench.db'),
+               PAGE_CACHE_BACKEND='null', SQL_INSTRUMENTATION='0')
+    os.environ.update(env)
+    try:
+        from app import create_app
+        from models import db
+        app = create_app()
+        with app.app_context():
+            seed(args.venues, args.artists, args.shows,
+                 random.Random(args.seed))
+            db.engine.dispose()
+
+        print('{} requests, {} concurrent, {:.0f} ms per statement'.format(
+            args.requests, args.concurrency, args.delay * 1000))
+        print('{:<10} {:>9} {:>10} {:>10}'.format(
+            'mode', 'req/s', 'p50 ms', 'p95 ms'))
+        for i, mode in enumerate(args.mode or ['sync', 'threaded', 'gevent']):
+            result = run(mode, args, env, args.port + i)
+            print('{:<10} {:>9.1f} {:>10.1f} {:>10.1f}'.format(
+                mode, result['rps'], result['p50_ms'], result['p95_ms']))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
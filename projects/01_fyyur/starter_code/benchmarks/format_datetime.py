@@ -0,0 +1,76 @@
+'''
+Micro-benchmark of the `datetime` template filter.
+
+Compares the per-call cost of the original filter (dateutil parse followed
+by babel.dates.format_datetime on every call) with formatting.format_datetime
+for string and datetime inputs, both for a page that repeats the same show
+times (memo hits) and for all-distinct values (memo misses).
+
+    $ python benchmarks/format_datetime.py [--calls N]
+'''
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates  # noqa: E402
+import dateutil.parser  # noqa: E402
+
+import formatting  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = value if isinstance(value, datetime) else dateutil.parser.parse(
+        value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def per_call(func, values, format):
+    def run():
+        for value in values:
+            func(value, format)
+
+    def clear():
+        formatting._format_naive.cache_clear()
+        formatting._format_string.cache_clear()
+    # every run starts with an empty memo, so "distinct" measures misses
+    seconds = min(timeit.repeat(run, setup=clear, number=1, repeat=5))
+    return seconds / len(values) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    start = datetime(2035, 4, 1, 20, 0)
+    distinct = [start + timedelta(minutes=i) for i in range(args.calls)]
+    repeated = [start + timedelta(days=i % 20) for i in range(args.calls)]
+    cases = [
+        ('str, distinct', [d.strftime('%Y-%m-%d %H:%M:%S') for d in distinct]),
+        ('str, repeated', [d.strftime('%Y-%m-%d %H:%M:%S') for d in repeated]),
+        ('datetime, distinct', distinct),
+        ('datetime, repeated', repeated),
+    ]
+    for value in (cases[0][1][0], cases[2][1][0]):
+        assert legacy_format_datetime(value, 'full') == \
+            formatting.format_datetime(value, 'full')
+
+    print('{:<20} {:>12} {:>12} {:>9}'.format(
+        'input', 'before (us)', 'after (us)', 'speedup'))
+    for name, values in cases:
+        before = per_call(legacy_format_datetime, values, 'full')
+        after = per_call(formatting.format_datetime, values, 'full')
+        print('{:<20} {:>12.2f} {:>12.2f} {:>8.1f}x'.format(
+            name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+'''
+Route-level load benchmark for Fyyur.
+
+Seeds a local database (a throwaway sqlite file by default, or any
+--database-url such as a local postgres) with synthetic venues, artists and
+shows, drives every route through the Flask test client and reports
+throughput and p50/p95/p99 latency per route. Results are compared with a
+stored baseline and the run fails if any route's p95 regressed by more than
+--max-regression percent.
+
+    $ python benchmarks/routes.py                      # compare to baseline
+    $ python benchmarks/routes.py --update-baseline    # record a new one
+    $ python benchmarks/routes.py --venues 20000 --shows 200000 --requests 50
+
+config.py reads the environment when it is imported, so the database and
+cache settings are put in the environment before the app is created.
+'''
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic',
+          'Folk', 'Funk', 'Hip-Hop', 'Jazz', 'Pop', 'Punk', 'Rock n Roll']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Seattle', 'WA'), ('Chicago', 'IL'), ('Boston', 'MA')]
+WORDS = ['Musical', 'Hop', 'Park', 'Square', 'Live', 'Coffee', 'Dueling',
+         'Pianos', 'Wild', 'Sax', 'Band', 'Guns', 'Petals', 'Blue', 'Room']
+
+
+def seed(venues, artists, shows, rnd):
+    from models import db, Venue, Artist, Show
+    db.drop_all()
+    db.create_all()
+
+    def name(i):
+        return '{} {} {}'.format(rnd.choice(WORDS), rnd.choice(WORDS), i)
+
+    def entity(i):
+        city, state = rnd.choice(CITIES)
+        return {'name': name(i), 'city': city, 'state': state,
+                'phone': '555-555-{:04d}'.format(i % 10000),
+                'image_link': 'https://example.com/{}.jpg'.format(i),
+                'facebook_link': 'https://facebook.com/{}'.format(i),
+                'genres': rnd.sample(GENRES, 2)}
+
+    now = datetime.now().replace(microsecond=0)
+    with db.engine.begin() as conn:
+        conn.execute(Venue.__table__.insert(), [
+            dict(entity(i), address='{} Main St'.format(i))
+            for i in range(venues)])
+        conn.execute(Artist.__table__.insert(), [
+            entity(i) for i in range(artists)])
+        for start in range(0, shows, 10000):
+            conn.execute(Show.__table__.insert(), [{
+                'venue_id': rnd.randint(1, venues),
+                'artist_id': rnd.randint(1, artists),
+                'start_time': now + timedelta(
+                    hours=rnd.randint(-24 * 365, 24 * 365)),
+            } for _ in range(start, min(start + 10000, shows))])
+
+
+def routes(venues, artists, rnd):
+    '''
+    (name, method, url, form data, expected status) for every route; the
+    url and form data are factories. The create forms re-render the home
+    page and the edit forms redirect to the edited page.
+    '''
+    counter = iter(range(10 ** 9))
+
+    def venue_form():
+        return {'name': 'Bench Venue {}'.format(next(counter)),
+                'city': 'Austin', 'state': 'TX', 'address': '1 Bench St',
+                'phone': '555-555-0000', 'genres': 'Jazz',
+                'facebook_link': 'https://facebook.com/bench'}
+
+    def artist_form():
+        form = venue_form()
+        form['name'] = 'Bench Artist {}'.format(next(counter))
+        return form
+
+    def show_form():
+        return {'venue_id': rnd.randint(1, venues),
+                'artist_id': rnd.randint(1, artists),
+                'start_time': (datetime.now() + timedelta(
+                    days=rnd.randint(1, 365))).strftime('%Y-%m-%d %H:%M:%S')}
+
+    def venue():
+        return rnd.randint(1, venues)
+
+    def artist():
+        return rnd.randint(1, artists)
+
+    today = datetime.now().date()
+    month = '?from={}&to={}'.format(today, today + timedelta(days=30))
+    return [
+        ('index', 'GET', lambda: '/', None, 200),
+        ('venues', 'GET', lambda: '/venues', None, 200),
+        ('artists', 'GET', lambda: '/artists', None, 200),
+        ('shows', 'GET', lambda: '/shows', None, 200),
+        ('shows_window', 'GET', lambda: '/shows' + month, None, 200),
+        ('show_venue', 'GET', lambda: '/venues/{}'.format(venue()), None,
+         200),
+        ('show_artist', 'GET', lambda: '/artists/{}'.format(artist()), None,
+         200),
+        ('search_venues', 'POST', lambda: '/venues/search',
+         lambda: {'search_term': rnd.choice(WORDS)}, 200),
+        ('search_artists', 'POST', lambda: '/artists/search',
+         lambda: {'search_term': rnd.choice(WORDS)[:3]}, 200),
+        ('genres', 'GET', lambda: '/genres', None, 200),
+        ('genre_venues', 'GET',
+         lambda: '/genres/{}/venues'.format(rnd.choice(GENRES)), None, 200),
+        ('genre_artists', 'GET',
+         lambda: '/genres/{}/artists'.format(rnd.choice(GENRES)), None, 200),
+        ('venue_calendar', 'GET',
+         lambda: '/venues/{}/calendar'.format(venue()), None, 200),
+        ('artist_calendar', 'GET',
+         lambda: '/artists/{}/calendar'.format(artist()), None, 200),
+        ('venue_calendar_ics', 'GET',
+         lambda: '/venues/{}/calendar.ics'.format(venue()), None, 200),
+        ('artist_calendar_ics', 'GET',
+         lambda: '/artists/{}/calendar.ics'.format(artist()), None, 200),
+        ('create_venue_form', 'GET', lambda: '/venues/create', None, 200),
+        ('create_artist_form', 'GET', lambda: '/artists/create', None, 200),
+        ('create_shows', 'GET', lambda: '/shows/create', None, 200),
+        ('edit_venue', 'GET', lambda: '/venues/{}/edit'.format(venue()),
+         None, 200),
+        ('edit_artist', 'GET',
+         lambda: '/artists/{}/edit'.format(artist()), None, 200),
+        ('create_venue_submission', 'POST', lambda: '/venues/create',
+         venue_form, 200),
+        ('create_artist_submission', 'POST', lambda: '/artists/create',
+         artist_form, 200),
+        ('create_show_submission', 'POST', lambda: '/shows/create',
+         show_form, 200),
+        ('edit_venue_submission', 'POST',
+         lambda: '/venues/{}/edit'.format(venue()), venue_form, 302),
+        ('edit_artist_submission', 'POST',
+         lambda: '/artists/{}/edit'.format(artist()), artist_form, 302),
+        ('export_shows', 'GET', lambda: '/export/shows.csv', None, 200),
+    ]
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    rank = max(1, int(math.ceil(p / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def run(client, route, requests, warmup):
+    name, method, url, data, status = route
+    latencies = []
+    for i in range(warmup + requests):
+        kwargs = {'data': data()} if data else {}
+        path = url()
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        # an error page (a 404, a rejected form) is fast and would be timed
+        # as if the route had done its work
+        if response.status_code != status:
+            raise RuntimeError('{} {} returned {}, expected {}'.format(
+                method, path, response.status_code, status))
+        if i >= warmup:
+            latencies.append(elapsed)
+    return {
+        'requests': requests,
+        'rps': round(requests / sum(latencies), 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms']
+        result['p95_change_pct'] = round(change * 100, 1)
+        if change * 100 > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fyyur route-level load benchmark.')
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=30,
+                        help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-url',
+                        help='database to seed (default: a temporary sqlite '
+                             'file); it is dropped and recreated')
+    parser.add_argument('--page-cache', action='store_true',
+                        help='keep the rendered page cache enabled')
+    parser.add_argument('--route', action='append',
+                        help='only run the named route(s)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--max-regression', type=float, default=25.0,
+                        help='allowed p95 regression per route, in percent')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+    volumes = {'venues': args.venues, 'artists': args.artists,
+               'shows': args.shows}
+
+    # timings only compare across runs over the same amount of data
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get('volumes') != volumes:
+            sys.exit('baseline {} was recorded with {}, not {}; rerun with '
+                     'those volumes or --update-baseline'.format(
+                         args.baseline, stored.get('volumes'), volumes))
+        baseline = stored['routes']
+
+    tmpdir = None
+    if not args.database_url:
+        tmpdir = tempfile.mkdtemp(prefix='fyyur-bench-')
+        args.database_url = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['SQL_INSTRUMENTATION'] = '0'
+    if not args.page_cache:
+        os.environ['PAGE_CACHE_BACKEND'] = 'null'
+
+    from app import create_app
+    from models import db
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    rnd = random.Random(args.seed)
+    started = time.perf_counter()
+    with app.app_context():
+        seed(args.venues, args.artists, args.shows, rnd)
+    print('seeded {} venues, {} artists, {} shows in {:.1f}s'.format(
+        args.venues, args.artists, args.shows, time.perf_counter() - started))
+
+    client = app.test_client()
+    results = {}
+    for route in routes(args.venues, args.artists, rnd):
+        if args.route and route[0] not in args.route:
+            continue
+        results[route[0]] = run(client, route, args.requests, args.warmup)
+    if tmpdir:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(tmpdir)
+
+    regressions = compare(results, baseline, args.max_regression)
+
+    print('{:<26} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        'route', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'p95 chg'))
+    for name, r in results.items():
+        change = r.get('p95_change_pct')
+        print('{:<26} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9}'.format(
+            name, r['rps'], r['p50_ms'], r['p95_ms'], r['p99_ms'],
+            '' if change is None else '{:+.1f}%'.format(change)))
+
+    report = {
+        'volumes': volumes,
+        'routes': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('baseline written to {}'.format(args.baseline))
+
+    if regressions:
+        print('p95 regressed by more than {}%: {}'.format(
+            args.max_regression, ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import DDL, and_, event, or_, select
+
+# Shows listed without an end time run this long.
+DEFAULT_DURATION = timedelta(hours=2)
+
+# No show runs longer. Bounding durations is what makes an overlap lookup a
+# range scan of the (venue_id, start_time) and (artist_id, start_time)
+# indexes: a show overlapping [start, end) must have started within
+# (start - MAX_DURATION, end).
+MAX_DURATION = timedelta(hours=24)
+
+POSTGRES_EXTENSION = 'CREATE EXTENSION IF NOT EXISTS btree_gist'
+
+POSTGRES_CONSTRAINTS = (
+    '''
+ALTER TABLE "{table}" ADD CONSTRAINT "ck_{table}_max_duration"
+CHECK (end_time <= start_time + interval '{hours} hours')
+''',
+    '''
+ALTER TABLE "{table}" ADD CONSTRAINT "ex_{table}_venue_id_during"
+EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)
+''',
+    '''
+ALTER TABLE "{table}" ADD CONSTRAINT "ex_{table}_artist_id_during"
+EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)
+''',
+)
+
+
+def exclude_overlaps(table):
+    '''
+    Attaches the postgres exclusion constraints that reject a show whose
+    [start_time, end_time) overlaps another at the same venue or by the same
+    artist, even between concurrent transactions. `db.create_all()` adds
+    them; existing databases get them from the migrations. Elsewhere the
+    conflicts() check in the writing transaction is all there is.
+    '''
+    names = {'table': table.name,
+             'hours': int(MAX_DURATION.total_seconds() // 3600)}
+    event.listen(table, 'before_create', DDL(
+        POSTGRES_EXTENSION).execute_if(dialect='postgresql'))
+    for statement in POSTGRES_CONSTRAINTS:
+        event.listen(table, 'after_create', DDL(
+            statement.format(**names)).execute_if(dialect='postgresql'))
+
+
+def show_end(start_time, end_time=None):
+    '''
+    Returns the end of a show starting at `start_time`, DEFAULT_DURATION
+    later unless given. Raises ValueError for a show ending before it
+    starts or running longer than MAX_DURATION.
+    '''
+    if end_time is None:
+        return start_time + DEFAULT_DURATION
+    if not start_time < end_time <= start_time + MAX_DURATION:
+        raise ValueError('a show must end after it starts and run at most '
+                         '{}'.format(MAX_DURATION))
+    return end_time
+
+
+class Bookings(object):
+    '''Shows per venue and per artist, sorted by start time.'''
+
+    def __init__(self):
+        self._times = defaultdict(list)
+
+    @staticmethod
+    def _keys(show):
+        return (('venue', show['venue_id']), ('artist', show['artist_id']))
+
+    def add(self, show):
+        for key in self._keys(show):
+            insort(self._times[key], (show['start_time'], show['end_time']))
+
+    def overlaps(self, show):
+        start, end = show['start_time'], show['end_time']
+        for key in self._keys(show):
+            times = self._times[key]
+            i = bisect_left(times, (start - MAX_DURATION,))
+            while i < len(times) and times[i][0] < end:
+                if times[i][1] > start:
+                    return True
+                i += 1
+        return False
+
+
+def conflicts(conn, table, shows):
+    '''
+    Returns the positions in `shows` (mappings with venue_id, artist_id,
+    start_time and end_time) of the shows that overlap a stored show, or an
+    earlier show in `shows`, at the same venue or by the same artist.
+
+    The stored shows that could overlap any of them are fetched with one
+    query, an OR of index range scans, so checking a whole batch costs one
+    round trip and O(log n) per show rather than a scan of the table.
+    '''
+    if not shows:
+        return []
+    c = table.c
+    ranges = []
+    for show in shows:
+        earliest = show['start_time'] - MAX_DURATION
+        for column in (c.venue_id, c.artist_id):
+            ranges.append(and_(column == show[column.name],
+                               c.start_time > earliest,
+                               c.start_time < show['end_time']))
+    booked = Bookings()
+    for row in conn.execute(select(
+            [c.venue_id, c.artist_id, c.start_time, c.end_time]).where(
+            or_(*ranges))):
+        booked.add(row)
+    clashes = []
+    for i, show in enumerate(shows):
+        if booked.overlaps(show):
+            clashes.append(i)
+        else:
+            booked.add(show)
+    return clashes
@@ -0,0 +1,328 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from itertools import islice
+
+import dateutil.parser
+from sqlalchemy import tuple_
+
+import booking
+import counters
+
+
+class ImportStats(object):
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.conflicts = 0
+
+    def __str__(self):
+        return ('{} read, {} inserted, {} duplicates, {} invalid, '
+                '{} conflicts').format(
+            self.read, self.inserted, self.duplicates, self.invalid,
+            self.conflicts)
+
+
+def iter_json_array(f, block_size=65536):
+    '''Yields the objects of a top-level JSON array without loading it all.'''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer and not eof:
+                block = f.read(block_size)
+                eof = not block
+                buffer += block
+                continue
+            if not buffer.startswith('['):
+                raise ValueError('expected a JSON array')
+            buffer = buffer[1:]
+            started = True
+            continue
+        buffer = buffer.lstrip(', \t\r\n')
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise ValueError('truncated JSON array')
+            block = f.read(block_size)
+            eof = not block
+            buffer += block
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+def read_rows(path):
+    '''
+    Streams rows as dicts from a .csv file (header row), a .jsonl/.ndjson
+    file (one object per line) or a .json file holding an array of objects.
+    '''
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if ext == '.csv':
+            for row in csv.DictReader(f):
+                yield row
+        elif ext in ('.jsonl', '.ndjson'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif ext == '.json':
+            for row in iter_json_array(f):
+                yield row
+        else:
+            raise ValueError('unsupported file type: {}'.format(ext))
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_genres(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            value = value.split(',')
+    return [genre.strip() for genre in value if genre and genre.strip()]
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _pg_array(values):
+    return '{' + ','.join('"{}"'.format(
+        v.replace('\\', '\\\\').replace('"', '\\"')) for v in values) + '}'
+
+
+class Importer(object):
+    '''
+    Loads one table in chunks: each chunk is normalized, checked for
+    duplicates against the database with one set-based query (and against
+    rows seen earlier in the file), then inserted in a single statement -
+    COPY on postgres, executemany elsewhere - and committed.
+    '''
+
+    columns = ()
+
+    def __init__(self, db, table, chunk_size=1000, progress=None):
+        self.db = db
+        self.table = table
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.seen = set()
+
+    def normalize(self, row):
+        raise NotImplementedError
+
+    def key(self, row):
+        raise NotImplementedError
+
+    def existing(self, conn, keys):
+        raise NotImplementedError
+
+    def run(self, path):
+        stats = ImportStats()
+        for chunk in chunked(read_rows(path), self.chunk_size):
+            stats.read += len(chunk)
+            rows = []
+            for raw in chunk:
+                try:
+                    row = self.normalize(raw)
+                except (KeyError, TypeError, ValueError, OverflowError):
+                    row = None
+                if row is None:
+                    stats.invalid += 1
+                else:
+                    rows.append(row)
+            with self.db.engine.begin() as conn:
+                rows = self.validate(conn, rows, stats)
+                existing = self.existing(
+                    conn, set(self.key(row) for row in rows))
+                fresh = []
+                for row in rows:
+                    key = self.key(row)
+                    if key in existing or key in self.seen:
+                        stats.duplicates += 1
+                        continue
+                    self.seen.add(key)
+                    fresh.append(row)
+                fresh = self.check(conn, fresh, stats)
+                self.insert(conn, fresh)
+            stats.inserted += len(fresh)
+            if self.progress:
+                self.progress(stats)
+        return stats
+
+    def validate(self, conn, rows, stats):
+        return rows
+
+    def check(self, conn, rows, stats):
+        # rows that are new but may not be inserted next to the stored ones
+        return rows
+
+    def insert(self, conn, rows):
+        if not rows:
+            return
+        if conn.dialect.name == 'postgresql':
+            self.copy(conn, rows)
+        else:
+            conn.execute(self.table.insert(), rows)
+
+    def copy(self, conn, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([self.copy_value(row[column])
+                             for column in self.columns])
+        buffer.seek(0)
+        statement = 'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            self.table.name, ', '.join(self.columns))
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(statement, buffer)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def copy_value(value):
+        if isinstance(value, list):
+            return _pg_array(value)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+
+class NamedImporter(Importer):
+    '''Venues and artists, de-duplicated by name.'''
+
+    def key(self, row):
+        return row['name']
+
+    def existing(self, conn, keys):
+        if not keys:
+            return set()
+        name = self.table.c.name
+        return set(r[0] for r in conn.execute(
+            self.table.select().with_only_columns([name]).where(
+                name.in_(list(keys)))))
+
+    def normalize(self, row):
+        data = {column: _text(row.get(column)) for column in self.columns}
+        if not data['name']:
+            return None
+        data['genres'] = parse_genres(row.get('genres'))
+        return data
+
+
+class VenueImporter(NamedImporter):
+    columns = ('name', 'city', 'state', 'address', 'phone', 'image_link',
+               'facebook_link', 'genres')
+
+
+class ArtistImporter(NamedImporter):
+    columns = ('name', 'city', 'state', 'phone', 'image_link',
+               'facebook_link', 'genres')
+
+
+class ShowImporter(Importer):
+    '''
+    Shows, de-duplicated by (venue_id, artist_id, start_time). Rows naming a
+    venue or artist that does not exist are counted as invalid, and rows
+    overlapping a show at the same venue or by the same artist as
+    conflicts. The venue and artist show counters are updated in the same
+    transaction.
+    '''
+
+    columns = ('venue_id', 'artist_id', 'start_time', 'end_time',
+               'is_upcoming')
+
+    def __init__(self, db, table, venue_table, artist_table, **kwargs):
+        super(ShowImporter, self).__init__(db, table, **kwargs)
+        self.venue_table = venue_table
+        self.artist_table = artist_table
+
+    def normalize(self, row):
+        start_time = self.parse_time(row['start_time'])
+        end_time = row.get('end_time')
+        return {
+            'venue_id': int(row['venue_id']),
+            'artist_id': int(row['artist_id']),
+            'start_time': start_time,
+            'end_time': booking.show_end(
+                start_time, self.parse_time(end_time) if end_time else None),
+            'is_upcoming': start_time > datetime.now(),
+        }
+
+    @staticmethod
+    def parse_time(value):
+        # Show times are stored as naive local time, so a time given with
+        # `Z` or an offset is moved into the local zone.
+        if not hasattr(value, 'isoformat'):
+            value = dateutil.parser.parse(value)
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+
+    def key(self, row):
+        return (row['venue_id'], row['artist_id'], row['start_time'])
+
+    @staticmethod
+    def _ids(conn, table, ids):
+        if not ids:
+            return set()
+        return set(r[0] for r in conn.execute(
+            table.select().with_only_columns([table.c.id]).where(
+                table.c.id.in_(list(ids)))))
+
+    def validate(self, conn, rows, stats):
+        venues = self._ids(conn, self.venue_table,
+                           set(row['venue_id'] for row in rows))
+        artists = self._ids(conn, self.artist_table,
+                            set(row['artist_id'] for row in rows))
+        valid = [row for row in rows
+                 if row['venue_id'] in venues and row['artist_id'] in artists]
+        stats.invalid += len(rows) - len(valid)
+        return valid
+
+    def check(self, conn, rows, stats):
+        clashes = set(booking.conflicts(conn, self.table, rows))
+        stats.conflicts += len(clashes)
+        return [row for i, row in enumerate(rows) if i not in clashes]
+
+    def insert(self, conn, rows):
+        super(ShowImporter, self).insert(conn, rows)
+        counters.apply(conn, self.venue_table, self.artist_table, [
+            (row['venue_id'], row['artist_id'], row['is_upcoming'])
+            for row in rows])
+
+    def existing(self, conn, keys):
+        if not keys:
+            return set()
+        c = self.table.c
+        columns = tuple_(c.venue_id, c.artist_id, c.start_time)
+        return set(tuple(r) for r in conn.execute(
+            self.table.select().with_only_columns(
+                [c.venue_id, c.artist_id, c.start_time]).where(
+                columns.in_(list(keys)))))
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache(object):
+    '''In-process LRU cache whose entries also expire after `ttl` seconds.'''
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache(object):
+    '''
+    Cache shared by every worker process on a host, one file per key in
+    `directory`. Stands in locally for a shared cache server: entries written
+    or deleted by one worker are seen by all of them. Least recently used
+    files are pruned once there are more than `maxsize`.
+    '''
+
+    def __init__(self, directory, maxsize=1024, ttl=300):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.cache')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError):
+            return None
+        if expires < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + self.ttl, value), f,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self._prune()
+
+    def delete(self, *keys):
+        for key in keys:
+            self._remove(self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            self._remove(os.path.join(self.directory, name))
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        if len(entries) > self.maxsize:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.maxsize]:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class NullCache(object):
+    '''Disables caching.'''
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+def make_backend(config):
+    backend = config.get('PAGE_CACHE_BACKEND', 'memory')
+    maxsize = config.get('PAGE_CACHE_SIZE', 1024)
+    ttl = config.get('PAGE_CACHE_TTL', 300)
+    if backend == 'memory':
+        return MemoryCache(maxsize, ttl)
+    if backend == 'filesystem':
+        return FileSystemCache(config['PAGE_CACHE_DIR'], maxsize, ttl)
+    if backend == 'null':
+        return NullCache()
+    raise ValueError('unknown PAGE_CACHE_BACKEND: {}'.format(backend))
+
+
+class PageCache(object):
+    '''
+    Caches rendered entity pages under their ETag, which is made from the
+    row's updated_at. A write that changes what a page shows bumps that, so
+    the next request renders under a new key and every process, whatever
+    its backend, only ever pairs an ETag with the page rendered for it.
+    Superseded pages are left to age out of the backend.
+    '''
+
+    def __init__(self, backend=None, app=None):
+        self.backend = backend
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = make_backend(app.config)
+
+    def render(self, key, render):
+        page = self.backend.get(key)
+        if page is None:
+            page = render()
+            self.backend.set(key, page)
+        return page
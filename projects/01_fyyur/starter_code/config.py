@@ -10,4 +10,53 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/fyyur'
+# DATABASE_URL may point at a local sqlite file (sqlite:///fyyur.db) for
+# development without postgres.
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur')
+
+# Connection pool. pre-ping replaces connections the server dropped and
+# recycle retires them before idle timeouts on the server or a proxy do.
+# Pool size and overflow only apply to pooled (postgres) engines, so they
+# are left to SQLAlchemy's defaults unless set.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+}
+if os.environ.get('DB_POOL_SIZE'):
+    SQLALCHEMY_ENGINE_OPTIONS['pool_size'] = int(os.environ['DB_POOL_SIZE'])
+if os.environ.get('DB_MAX_OVERFLOW'):
+    SQLALCHEMY_ENGINE_OPTIONS['max_overflow'] = int(
+        os.environ['DB_MAX_OVERFLOW'])
+# Connections each worker of a preforking server opens right after the fork
+# (see gunicorn.conf.py), so its first requests do not pay for the connect.
+DB_POOL_PREOPEN = int(os.environ.get('DB_POOL_PREOPEN', 0))
+
+# Optional read replica. Read-only controllers query it; writes, and reads by
+# a client for REPLICA_STICKY_SECONDS after it wrote, go to the primary.
+SQLALCHEMY_BINDS = {}
+if os.environ.get('REPLICA_DATABASE_URL'):
+    SQLALCHEMY_BINDS['replica'] = os.environ['REPLICA_DATABASE_URL']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Maximum number of ranked results returned by the venue/artist search.
+SEARCH_RESULTS_LIMIT = 100
+
+# Default and maximum number of rows per page on the /artists, /venues and
+# /shows listings (overridable per request with ?per_page=).
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 20))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
+
+# Rendered venue/artist page cache: 'memory' (per process LRU), 'filesystem'
+# (shared by all workers on the host, in PAGE_CACHE_DIR) or 'null'.
+PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+PAGE_CACHE_DIR = os.environ.get(
+    'PAGE_CACHE_DIR', os.path.join(basedir, '.page_cache'))
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 1024))
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+
+# Per-request SQL counting/timing (Server-Timing header and a JSON log line
+# per request at DEBUG). A statement repeated this many times in one request
+# is logged as a suspected N+1 query, at WARNING.
+SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '1') == '1'
+SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', 5))
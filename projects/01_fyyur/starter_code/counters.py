@@ -0,0 +1,78 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam
+
+
+def tally(shows):
+    '''
+    Sums (venue_id, artist_id, is_upcoming) rows into per-venue and
+    per-artist [upcoming, past] counts.
+    '''
+    venues = defaultdict(lambda: [0, 0])
+    artists = defaultdict(lambda: [0, 0])
+    for venue_id, artist_id, is_upcoming in shows:
+        slot = 0 if is_upcoming else 1
+        venues[venue_id][slot] += 1
+        artists[artist_id][slot] += 1
+    return venues, artists
+
+
+def _update(conn, table, deltas):
+    # each row is updated relative to its current value, so concurrent
+    # writers do not lose each other's changes; updated_at is bumped as the
+    # entity's page changes with it.
+    if not deltas:
+        return
+    c = table.c
+    conn.execute(
+        table.update().where(c.id == bindparam('_id')).values(
+            upcoming_shows_count=c.upcoming_shows_count + bindparam('_up'),
+            past_shows_count=c.past_shows_count + bindparam('_past'),
+            updated_at=datetime.utcnow()),
+        [{'_id': id, '_up': up, '_past': past}
+         for id, (up, past) in deltas.items()])
+
+
+def apply(conn, venue_table, artist_table, shows, sign=1):
+    '''
+    Adds (sign=1) or removes (sign=-1) the given (venue_id, artist_id,
+    is_upcoming) shows from the venue and artist counter columns, in the
+    caller's transaction.
+    '''
+    venues, artists = tally(shows)
+    for table, counts in ((venue_table, venues), (artist_table, artists)):
+        _update(conn, table, {id: (sign * up, sign * past)
+                              for id, (up, past) in counts.items()})
+
+
+def rollover(conn, show_table, venue_table, artist_table, now=None,
+             batch_size=1000):
+    '''
+    Marks shows that have started as past and moves them from the upcoming
+    to the past counters, `batch_size` shows per transaction. Returns how
+    many shows were moved.
+    '''
+    now = now or datetime.now()
+    c = show_table.c
+    due = and_(c.is_upcoming.is_(True), c.start_time <= now)
+    moved = 0
+    while True:
+        with conn.begin():
+            # rows locked by a concurrent rollover are left to it
+            rows = conn.execute(
+                show_table.select().with_only_columns(
+                    [c.id, c.venue_id, c.artist_id]).where(due).order_by(
+                    c.start_time).limit(batch_size).with_for_update(
+                    skip_locked=True)).fetchall()
+            if not rows:
+                return moved
+            conn.execute(show_table.update().where(
+                c.id.in_([row.id for row in rows])).values(is_upcoming=False))
+            venues, artists = tally(
+                (row.venue_id, row.artist_id, True) for row in rows)
+            for table, counts in ((venue_table, venues),
+                                  (artist_table, artists)):
+                _update(conn, table, {id: (-up, up)
+                                      for id, (up, _) in counts.items()})
+        moved += len(rows)
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+# Rows read per round-trip from the server-side cursor.
+BATCH_SIZE = 1000
+
+
+def stream_rows(query, batch_size=BATCH_SIZE):
+    '''
+    Iterates a query in batches over a server-side cursor, so memory use
+    does not depend on the size of the table.
+    '''
+    return query.execution_options(stream_results=True).yield_per(batch_size)
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(columns, rows):
+    '''Yields a header line and then one CSV line per row.'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(columns)
+    yield flush()
+    for row in rows:
+        # genres are written as a JSON list, which `flask import` reads back
+        writer.writerow([
+            json.dumps(value) if isinstance(value, list) else _value(value)
+            for value in row])
+        yield flush()
+
+
+def iter_json(columns, rows):
+    '''Yields a JSON array of objects, one object at a time.'''
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(
+            dict(zip(columns, [_value(value) for value in row])))
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def gzipped(chunks, level=6, flush_size=64 * 1024):
+    '''
+    Gzip-compresses a stream of text chunks as it goes, emitting compressed
+    data whenever roughly `flush_size` bytes of input have accumulated.
+    '''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        pending += len(data)
+        out = compressor.compress(data)
+        if pending >= flush_size:
+            out += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def encoded(chunks, size=64 * 1024):
+    '''Encodes text chunks, coalescing them into ~`size` byte pieces.'''
+    parts = []
+    pending = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        pending += len(chunk)
+        if pending >= size:
+            yield ''.join(parts).encode('utf-8')
+            parts = []
+            pending = 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'json': (iter_json, 'application/json'),
+}
+
+
+def export(query, columns, format, compress=False):
+    '''
+    Returns (byte chunk iterator, mimetype) for exporting `query`, whose
+    rows hold the given `columns`, as csv or json, optionally gzipped.
+    '''
+    writer, mimetype = FORMATS[format]
+    chunks = writer(columns, stream_rows(query))
+    if compress:
+        return gzipped(chunks), 'application/gzip'
+    return encoded(chunks), mimetype
@@ -0,0 +1,59 @@
+from datetime import datetime
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+# Fyyur's named formats; anything else is passed to Babel as-is.
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# Babel's own named formats are resolved per locale by
+# babel.dates.format_datetime rather than parsed as patterns.
+BABEL_FORMATS = ('full', 'long', 'medium', 'short')
+
+
+@lru_cache(maxsize=None)
+def compiled_pattern(format, locale):
+    '''The parsed Babel pattern and Locale for (format, locale).'''
+    return babel.dates.parse_pattern(format), Locale.parse(locale)
+
+
+def _format(value, format, locale):
+    if format in BABEL_FORMATS:
+        return babel.dates.format_datetime(value, format, locale=locale)
+    pattern, locale = compiled_pattern(format, locale)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=babel.dates.UTC)
+    return pattern.apply(value, locale)
+
+
+# Only naive datetimes are memoized: aware ones at the same instant compare
+# (and hash) equal whatever their zone, but render in their own zone.
+_format_naive = lru_cache(maxsize=4096)(_format)
+
+
+def _format_datetime(value, format, locale):
+    if value.tzinfo is None:
+        return _format_naive(value, format, locale)
+    return _format(value, format, locale)
+
+
+@lru_cache(maxsize=4096)
+def _format_string(value, format, locale):
+    return _format_datetime(dateutil.parser.parse(value), format, locale)
+
+
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+    '''
+    Same output as babel.dates.format_datetime with Fyyur's named formats,
+    but datetimes skip dateutil parsing, patterns and locales are compiled
+    once, and the most recent results are memoized.
+    '''
+    format = PATTERNS.get(format, format)
+    if isinstance(value, datetime):
+        return _format_datetime(value, format, locale)
+    return _format_string(value, format, locale)
@@ -0,0 +1,151 @@
+from sqlalchemy import DDL, String, cast, column, event, func, table
+from sqlalchemy.dialects import postgresql
+
+# Postgres: genres stay a varchar[] column and a GIN index answers `@>`.
+POSTGRES_INDEX = '''
+CREATE INDEX IF NOT EXISTS "ix_{table}_genres" ON "{table}" USING gin (genres)
+'''
+
+# Facet counts are kept per genre by a trigger, so listing them reads a
+# few dozen rows instead of unnesting every row's genres.
+POSTGRES_COUNTS = (
+    '''
+CREATE TABLE IF NOT EXISTS {counts} (
+    genre VARCHAR PRIMARY KEY,
+    count INTEGER NOT NULL
+)
+''',
+    '''
+CREATE OR REPLACE FUNCTION {counts}_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.genres IS NOT DISTINCT FROM NEW.genres THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        UPDATE {counts} SET count = count - 1
+        WHERE genre IN (SELECT unnest(OLD.genres));
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO {counts} (genre, count)
+        SELECT DISTINCT genre, 1 FROM unnest(NEW.genres) AS genre
+        ON CONFLICT (genre) DO UPDATE SET count = {counts}.count + 1;
+    END IF;
+    RETURN NULL;
+END
+$$
+''',
+    '''
+CREATE TRIGGER {counts}_change
+AFTER INSERT OR DELETE OR UPDATE OF genres ON "{table}"
+FOR EACH ROW EXECUTE PROCEDURE {counts}_apply()
+''',
+)
+
+# SQLite: genres are stored as JSON, so a normalized (genre, id) side table
+# is kept in sync by triggers. Its primary key leads with the genre, which
+# makes both browsing and facet counts index-only lookups.
+SQLITE_TABLE = '''
+CREATE TABLE {side} (
+    genre VARCHAR NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (genre, id)
+) WITHOUT ROWID
+'''
+
+SQLITE_ID_INDEX = '''
+CREATE INDEX ix_{side}_id ON {side} (id)
+'''
+
+SQLITE_TRIGGERS = (
+    '''
+CREATE TRIGGER {side}_ai AFTER INSERT ON "{table}" BEGIN
+    INSERT OR IGNORE INTO {side}(genre, id)
+    SELECT value, new.id FROM json_each(new.genres);
+END
+''',
+    '''
+CREATE TRIGGER {side}_ad AFTER DELETE ON "{table}" BEGIN
+    DELETE FROM {side} WHERE id = old.id;
+END
+''',
+    '''
+CREATE TRIGGER {side}_au AFTER UPDATE OF id, genres ON "{table}" BEGIN
+    DELETE FROM {side} WHERE id = old.id;
+    INSERT OR IGNORE INTO {side}(genre, id)
+    SELECT value, new.id FROM json_each(new.genres);
+END
+''',
+)
+
+
+class GenreIndex(object):
+    '''
+    Genre browsing and facet counts for a Venue or Artist: a GIN index and
+    a trigger-maintained count per genre on postgres, a trigger-maintained
+    side table on sqlite. Like SearchIndex, the DDL runs with
+    `db.create_all()` and existing postgres databases get it from the
+    migrations.
+    '''
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        name = model.__tablename__
+        self.side = table('{}_genre'.format(name.lower()),
+                          column('genre'), column('id'))
+        self.counts = table('{}_genre_count'.format(name.lower()),
+                            column('genre'), column('count'))
+
+        names = {'table': name, 'side': self.side.name,
+                 'counts': self.counts.name}
+        target = model.__table__
+        for statement in (POSTGRES_INDEX,) + POSTGRES_COUNTS:
+            event.listen(target, 'after_create', DDL(
+                statement.format(**names)).execute_if(dialect='postgresql'))
+        for statement in (SQLITE_TABLE, SQLITE_ID_INDEX) + SQLITE_TRIGGERS:
+            event.listen(target, 'after_create', DDL(
+                statement.format(**names)).execute_if(dialect='sqlite'))
+        event.listen(target, 'before_drop', DDL(
+            'DROP TABLE IF EXISTS {side}'.format(**names)).execute_if(
+                dialect='sqlite'))
+        event.listen(target, 'before_drop', DDL(
+            'DROP TABLE IF EXISTS {counts}'.format(**names)).execute_if(
+                dialect='postgresql'))
+
+    def _dialect(self):
+        return self.db.session.get_bind(self.model.__mapper__).dialect.name
+
+    def browse(self, genre):
+        '''Query of the rows tagged with `genre`.'''
+        model = self.model
+        dialect = self._dialect()
+        if dialect == 'postgresql':
+            wanted = cast(postgresql.array([genre]),
+                          postgresql.ARRAY(String))
+            return model.query.filter(model.genres.op('@>')(wanted))
+        if dialect == 'sqlite':
+            return model.query.join(
+                self.side, self.side.c.id == model.id).filter(
+                self.side.c.genre == genre)
+        return model.query.filter(
+            cast(model.genres, String).contains('"{}"'.format(genre)))
+
+    def facets(self):
+        '''(genre, count) pairs, most common genre first.'''
+        dialect = self._dialect()
+        if dialect == 'postgresql':
+            counts = self.counts.c
+            return self.db.session.query(counts.genre, counts.count).filter(
+                counts.count > 0).order_by(
+                counts.count.desc(), counts.genre).all()
+        if dialect == 'sqlite':
+            genre = self.side.c.genre
+            query = self.db.session.query(genre, func.count()).select_from(
+                self.side).group_by(genre)
+        else:
+            genres = self.db.session.query(
+                func.unnest(self.model.genres).label('genre')).subquery()
+            genre = genres.c.genre
+            query = self.db.session.query(genre, func.count()).group_by(genre)
+        return query.order_by(func.count().desc(), genre).all()
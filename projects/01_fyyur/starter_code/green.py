@@ -0,0 +1,41 @@
+'''
+Cooperative I/O for serving Fyyur from gevent workers.
+
+Under gevent, a request waiting on the database yields to the other
+requests of the same process instead of blocking it, so one worker keeps
+many slow queries in flight. gevent's monkey patching covers sockets and
+sleeps; psycopg2 does its own I/O in C and needs the wait callback below.
+'''
+
+
+def gevent_wait_callback(conn, timeout=None):
+    '''Waits for a psycopg2 connection on the gevent hub, not the thread.'''
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(
+                'Bad result from poll: {!r}'.format(state))
+
+
+def patch():
+    '''
+    Monkey patches the standard library and makes psycopg2 cooperative.
+    Must run before the app (and anything opening sockets) is imported.
+    '''
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycopg2 import extensions
+    except ImportError:  # sqlite-only installs
+        return
+    extensions.set_wait_callback(gevent_wait_callback)
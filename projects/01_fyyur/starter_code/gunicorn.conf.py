@@ -0,0 +1,29 @@
+# gunicorn -c gunicorn.conf.py 'app:create_app()'
+#
+# The app is built once in the master and forked into the workers, which
+# share its compiled templates and configured models copy-on-write; each
+# worker then opens its own database connections.
+#
+# GUNICORN_WORKER_CLASS=gevent serves each worker's requests cooperatively
+# (see green.py), so requests waiting on a slow database do not hold up the
+# others; size DB_POOL_SIZE for the requests expected in flight per worker.
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+if worker_class == 'gevent':
+    from green import patch
+    patch()
+
+from warmup import after_fork, before_fork  # noqa: E402
+
+preload_app = True
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+
+
+def when_ready(server):
+    before_fork(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    after_fork(worker.app.wsgi())
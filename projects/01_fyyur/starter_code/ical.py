@@ -0,0 +1,56 @@
+from datetime import datetime
+
+PRODID = '-//Fyyur//Show Calendar//EN'
+
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(
+        ',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    '''Folds a content line into 75-octet pieces as RFC 5545 requires.'''
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # never split inside a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def iter_calendar(shows, name):
+    '''
+    Yields an iCalendar document one event at a time, so a long calendar
+    is never held in memory. `shows` is any iterable of rows with the
+    Show.listing() columns.
+    '''
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold('PRODID:' + PRODID)
+    yield fold('X-WR-CALNAME:' + escape(name))
+    for show in shows:
+        yield ''.join((
+            fold('BEGIN:VEVENT'),
+            fold('UID:show-{}@fyyur'.format(show.id)),
+            fold('DTSTAMP:' + stamp),
+            fold('DTSTART:' + format_time(show.start_time)),
+            fold('DTEND:' + format_time(show.end_time)),
+            fold('SUMMARY:' + escape('{} at {}'.format(
+                show.artist_name, show.venue_name))),
+            fold('LOCATION:' + escape(show.venue_name)),
+            fold('END:VEVENT'),
+        ))
+    yield fold('END:VCALENDAR')
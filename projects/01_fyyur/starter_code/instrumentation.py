@@ -0,0 +1,161 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter(object):
+    '''Collects the SQL statements an engine executes.'''
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context,
+                 executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine):
+    '''
+    Counts the statements executed against `engine` inside the block:
+
+        with count_queries(db.engine) as queries:
+            client.get('/shows')
+        print(queries.count)
+    '''
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    '''
+    Fails if the block executes more than `limit` statements, e.g. to check
+    that a listing page costs the same number of queries for ten shows as
+    for ten thousand.
+    '''
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        raise AssertionError(
+            '{} queries executed, expected at most {}:\n{}'.format(
+                counter.count, limit, '\n'.join(counter.statements)))
+
+
+class RequestStats(object):
+    '''SQL statements executed while serving one request.'''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        '''Statements executed at least `threshold` times: likely N+1s.'''
+        return [(statement, count)
+                for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+
+class SQLInstrumentation(object):
+    '''
+    Counts and times every SQL statement per request through engine events.
+    The totals are sent in a `Server-Timing` header and logged as one JSON
+    line per request at DEBUG; identical statements repeated at least
+    SQL_N_PLUS_ONE_THRESHOLD times within a request are logged as suspected
+    N+1 patterns at WARNING. Statements are compared with their bound
+    parameters left out, so `SELECT ... WHERE id = ?` run once per row
+    counts as a repeat.
+
+    Streamed responses are reported when their headers are sent, so queries
+    made while streaming the body are not included.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # a child of the app logger, so records reach the app's handlers
+        self.logger = app.logger.getChild('sql')
+        app.config.setdefault('SQL_INSTRUMENTATION', True)
+        app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 5)
+        if not app.config['SQL_INSTRUMENTATION']:
+            return
+        self.threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        # listening on the Engine class covers every engine and bind; it is
+        # done once per process however many apps create_app() builds.
+        if not event.contains(Engine, 'before_cursor_execute', self._before):
+            event.listen(Engine, 'before_cursor_execute', self._before)
+            event.listen(Engine, 'after_cursor_execute', self._after)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    # The start time is kept on the statement's execution context rather
+    # than the connection, so a statement that fails (and never reaches
+    # after_cursor_execute) leaves nothing behind on the pooled connection.
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._sql_started = time.perf_counter()
+
+    @staticmethod
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = g.get('sql_stats') if has_request_context() else None
+        if stats is None:
+            return
+        started = getattr(context, '_sql_started', None)
+        stats.record(statement, 0.0 if started is None
+                     else time.perf_counter() - started)
+
+    @staticmethod
+    def _start():
+        g.sql_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        total = (time.perf_counter() - stats.started) * 1000
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} {}"'
+                             .format(stats.duration * 1000, stats.count,
+                                     'query' if stats.count == 1
+                                     else 'queries'))
+        response.headers.add('Server-Timing', 'app;dur={:.2f}'.format(total))
+        repeated = stats.repeated(self.threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 2),
+            'total_ms': round(total, 2),
+        }
+        if repeated:
+            record['suspected_n_plus_one'] = [
+                {'statement': statement, 'count': count}
+                for statement, count in repeated]
+            self.logger.warning(json.dumps(record))
+        else:
+            self.logger.debug(json.dumps(record))
+        return response
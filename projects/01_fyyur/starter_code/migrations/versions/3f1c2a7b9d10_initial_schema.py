@@ -0,0 +1,60 @@
+"""initial schema
+
+Revision ID: 3f1c2a7b9d10
+Revises:
+Create Date: 2020-03-02 18:04:11.125112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7b9d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'Venue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('city', sa.String(length=120), nullable=True),
+        sa.Column('state', sa.String(length=120), nullable=True),
+        sa.Column('address', sa.String(length=120), nullable=True),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'Artist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('city', sa.String(length=120), nullable=True),
+        sa.Column('state', sa.String(length=120), nullable=True),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'Show',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('Show')
+    op.drop_table('Artist')
+    op.drop_table('Venue')
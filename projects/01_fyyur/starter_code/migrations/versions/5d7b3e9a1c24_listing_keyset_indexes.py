@@ -0,0 +1,27 @@
+"""composite indexes backing keyset pagination of the listings
+
+Revision ID: 5d7b3e9a1c24
+Revises: c52d8e1f4a90
+Create Date: 2020-03-23 20:11:36.418027
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7b3e9a1c24'
+down_revision = 'c52d8e1f4a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_city_state_name_id', 'Venue',
+                    ['city', 'state', 'name', 'id'], unique=False)
+    op.create_index('ix_Artist_name_id', 'Artist',
+                    ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
+    op.drop_index('ix_Venue_city_state_name_id', table_name='Venue')
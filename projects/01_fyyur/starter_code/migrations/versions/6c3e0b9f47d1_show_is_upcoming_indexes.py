@@ -0,0 +1,29 @@
+"""per-venue and per-artist indexes on the past/upcoming split
+
+Revision ID: 6c3e0b9f47d1
+Revises: d19e5b7c3a28
+Create Date: 2020-04-16 18:52:07.641903
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6c3e0b9f47d1'
+down_revision = 'd19e5b7c3a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_is_upcoming_start_time', 'Show',
+                    ['venue_id', 'is_upcoming', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_is_upcoming_start_time', 'Show',
+                    ['artist_id', 'is_upcoming', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_is_upcoming_start_time',
+                  table_name='Show')
+    op.drop_index('ix_Show_venue_id_is_upcoming_start_time',
+                  table_name='Show')
@@ -0,0 +1,49 @@
+"""store Show.start_time as a timestamp and index it
+
+Revision ID: 8a4e6c0d2b57
+Revises: 3f1c2a7b9d10
+Create Date: 2020-03-09 21:17:45.502318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6c0d2b57'
+down_revision = '3f1c2a7b9d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows were written as '%Y-%m-%d %H:%M:%S' strings, which
+    # postgres casts to a timestamp as-is.
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column(
+            'start_time',
+            existing_type=sa.String(),
+            type_=sa.DateTime(),
+            existing_nullable=False,
+            postgresql_using='start_time::timestamp without time zone')
+        batch_op.create_index(
+            'ix_Show_start_time', ['start_time'], unique=False)
+        batch_op.create_index(
+            'ix_Show_venue_id_start_time', ['venue_id', 'start_time'],
+            unique=False)
+        batch_op.create_index(
+            'ix_Show_artist_id_start_time', ['artist_id', 'start_time'],
+            unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_index('ix_Show_artist_id_start_time')
+        batch_op.drop_index('ix_Show_venue_id_start_time')
+        batch_op.drop_index('ix_Show_start_time')
+        batch_op.alter_column(
+            'start_time',
+            existing_type=sa.DateTime(),
+            type_=sa.String(),
+            existing_nullable=False,
+            postgresql_using="to_char(start_time, 'YYYY-MM-DD HH24:MI:SS')")
@@ -0,0 +1,30 @@
+"""updated_at on Venue, Artist and Show
+
+Revision ID: a4c2e8b51f37
+Revises: f3a9c1d7e062
+Create Date: 2020-04-07 19:12:44.301562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c2e8b51f37'
+down_revision = 'f3a9c1d7e062'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(
+                'updated_at', sa.DateTime(), nullable=False,
+                server_default=sa.func.now()))
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
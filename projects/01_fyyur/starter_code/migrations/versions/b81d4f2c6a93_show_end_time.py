@@ -0,0 +1,59 @@
+"""Show end_time and overlap constraints
+
+Revision ID: b81d4f2c6a93
+Revises: a4c2e8b51f37
+Create Date: 2020-04-08 21:03:27.554102
+
+Existing shows are given the default two hour duration. On postgres the
+exclusion constraints fail to build if the stored shows already overlap;
+resolve those bookings and rerun the upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81d4f2c6a93'
+down_revision = 'a4c2e8b51f37'
+branch_labels = None
+depends_on = None
+
+EXCLUDE = '''
+ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{column}_during"
+EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)
+'''
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(),
+                                      nullable=True))
+    if postgres:
+        op.execute('''UPDATE "Show"
+                      SET end_time = start_time + interval '2 hours' ''')
+    else:
+        # keep the stored fraction so end times sort with start times
+        op.execute('''UPDATE "Show"
+                      SET end_time = datetime(start_time, '+2 hours') ||
+                                     substr(start_time, 20)''')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(),
+                              nullable=False)
+        batch_op.create_check_constraint(
+            'ck_Show_end_after_start', 'end_time > start_time')
+
+    if postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.create_check_constraint(
+            'ck_Show_max_duration', 'Show',
+            "end_time <= start_time + interval '24 hours'")
+        for column in ('venue_id', 'artist_id'):
+            op.execute(EXCLUDE.format(column=column))
+
+
+def downgrade():
+    # the constraints go with the column; on sqlite the batch copy of the
+    # table does not carry the check over either
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
@@ -0,0 +1,45 @@
+"""full-text search indexes on Venue and Artist
+
+Revision ID: c52d8e1f4a90
+Revises: 8a4e6c0d2b57
+Create Date: 2020-03-16 19:42:03.871554
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d8e1f4a90'
+down_revision = '8a4e6c0d2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('''
+CREATE OR REPLACE FUNCTION fyyur_search_document(
+    name varchar, city varchar, state varchar, genres varchar[])
+RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+           setweight(to_tsvector('simple', coalesce(city, '') || ' ' ||
+                                           coalesce(state, '')), 'B') ||
+           setweight(to_tsvector('simple',
+                                 coalesce(array_to_string(genres, ' '), '')),
+                     'C')
+$$
+''')
+    op.execute('''
+CREATE INDEX IF NOT EXISTS "ix_Venue_search" ON "Venue"
+USING gin (fyyur_search_document(name, city, state, genres))
+''')
+    op.execute('''
+CREATE INDEX IF NOT EXISTS "ix_Artist_search" ON "Artist"
+USING gin (fyyur_search_document(name, city, state, genres))
+''')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS "ix_Artist_search"')
+    op.execute('DROP INDEX IF EXISTS "ix_Venue_search"')
+    op.execute('DROP FUNCTION IF EXISTS '
+               'fyyur_search_document(varchar, varchar, varchar, varchar[])')
@@ -0,0 +1,79 @@
+"""trigger-maintained genre facet counts on postgres
+
+Revision ID: d19e5b7c3a28
+Revises: b81d4f2c6a93
+Create Date: 2020-04-13 19:27:45.310862
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd19e5b7c3a28'
+down_revision = 'b81d4f2c6a93'
+branch_labels = None
+depends_on = None
+
+TABLES = (('Venue', 'venue_genre_count'), ('Artist', 'artist_genre_count'))
+
+COUNTS = '''
+CREATE TABLE {counts} (
+    genre VARCHAR PRIMARY KEY,
+    count INTEGER NOT NULL
+)
+'''
+
+FUNCTION = '''
+CREATE OR REPLACE FUNCTION {counts}_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.genres IS NOT DISTINCT FROM NEW.genres THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        UPDATE {counts} SET count = count - 1
+        WHERE genre IN (SELECT unnest(OLD.genres));
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO {counts} (genre, count)
+        SELECT DISTINCT genre, 1 FROM unnest(NEW.genres) AS genre
+        ON CONFLICT (genre) DO UPDATE SET count = {counts}.count + 1;
+    END IF;
+    RETURN NULL;
+END
+$$
+'''
+
+TRIGGER = '''
+CREATE TRIGGER {counts}_change
+AFTER INSERT OR DELETE OR UPDATE OF genres ON "{table}"
+FOR EACH ROW EXECUTE PROCEDURE {counts}_apply()
+'''
+
+BACKFILL = '''
+INSERT INTO {counts} (genre, count)
+SELECT genre, count(DISTINCT id) FROM "{table}", unnest(genres) AS genre
+GROUP BY genre
+'''
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, counts in TABLES:
+        names = {'table': table, 'counts': counts}
+        # lock out writes so none falls between the backfill and the
+        # trigger
+        op.execute('LOCK TABLE "{table}" IN SHARE MODE'.format(**names))
+        for statement in (COUNTS, FUNCTION, TRIGGER, BACKFILL):
+            op.execute(statement.format(**names))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, counts in TABLES:
+        op.execute('DROP TRIGGER IF EXISTS {counts}_change ON "{table}"'
+                   .format(table=table, counts=counts))
+        op.execute('DROP FUNCTION IF EXISTS {}_apply()'.format(counts))
+        op.execute('DROP TABLE IF EXISTS {}'.format(counts))
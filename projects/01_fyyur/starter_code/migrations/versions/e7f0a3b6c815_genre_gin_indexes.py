@@ -0,0 +1,27 @@
+"""GIN indexes on Venue.genres and Artist.genres
+
+Revision ID: e7f0a3b6c815
+Revises: 5d7b3e9a1c24
+Create Date: 2020-03-30 18:55:21.603417
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7f0a3b6c815'
+down_revision = '5d7b3e9a1c24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
@@ -0,0 +1,75 @@
+"""upcoming/past show counters on Venue and Artist
+
+Revision ID: f3a9c1d7e062
+Revises: e7f0a3b6c815
+Create Date: 2020-04-06 20:41:09.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c1d7e062'
+down_revision = 'e7f0a3b6c815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column(
+            'is_upcoming', sa.Boolean(), nullable=False,
+            server_default=sa.true()))
+        batch_op.create_index(
+            'ix_Show_is_upcoming_start_time', ['is_upcoming', 'start_time'],
+            unique=False)
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(
+                'upcoming_shows_count', sa.Integer(), nullable=False,
+                server_default='0'))
+            batch_op.add_column(sa.Column(
+                'past_shows_count', sa.Integer(), nullable=False,
+                server_default='0'))
+
+    # Backfill from the shows as of now; `flask rollover-shows` keeps the
+    # counters current from here on.
+    show = sa.table('Show', sa.column('venue_id'), sa.column('artist_id'),
+                    sa.column('start_time'), sa.column('is_upcoming'))
+    op.execute(show.update().values(
+        is_upcoming=show.c.start_time > sa.func.now()))
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        target = sa.table(table, sa.column('id'),
+                          sa.column('upcoming_shows_count'),
+                          sa.column('past_shows_count'))
+
+        def count(upcoming):
+            return sa.select([sa.func.count()]).where(sa.and_(
+                show.c[key] == target.c.id,
+                show.c.is_upcoming.is_(upcoming))).as_scalar()
+
+        op.execute(target.update().values(
+            upcoming_shows_count=count(True), past_shows_count=count(False)))
+
+    op.create_index(
+        'ix_Venue_city_state_upcoming_shows_count_name_id', 'Venue',
+        ['city', 'state', sa.text('upcoming_shows_count DESC'), 'name', 'id'],
+        unique=False)
+    op.create_index(
+        'ix_Artist_upcoming_shows_count_name_id', 'Artist',
+        [sa.text('upcoming_shows_count DESC'), 'name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_upcoming_shows_count_name_id',
+                  table_name='Artist')
+    op.drop_index('ix_Venue_city_state_upcoming_shows_count_name_id',
+                  table_name='Venue')
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_index('ix_Show_is_upcoming_start_time')
+        batch_op.drop_column('is_upcoming')
@@ -0,0 +1,218 @@
+from datetime import datetime
+
+from sqlalchemy import event, func
+
+import booking
+import counters
+from genres import GenreIndex
+from routing import RoutingSQLAlchemy
+from search import SearchIndex
+
+# Bound to the application in app.create_app(); nothing here touches the
+# database at import time.
+db = RoutingSQLAlchemy()
+
+# Genres are a postgres array; sqlite (local runs) stores them as JSON.
+Genres = db.ARRAY(db.String()).with_variant(db.JSON(), 'sqlite')
+
+
+def updated_at_column():
+    # Set on every ORM update. Writes that change what a venue or artist
+    # page shows without updating its row (shows written, counters rolled
+    # over, a related artist or venue edited) set it through touch() or
+    # counters.apply(), so it is a validator for the whole page.
+    return db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                     onupdate=datetime.utcnow, server_default=func.now())
+
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_city_state_name_id', 'city', 'state', 'name', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    address = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    shows = db.relationship('Show', backref='venue', lazy=True)
+    genres = db.Column(Genres)
+    # Maintained by counters.apply() as shows are written and moved from
+    # upcoming to past by `flask rollover-shows`.
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = updated_at_column()
+
+    @property
+    def past_shows(self):
+        return Show.past(Show.venue_id == self.id).order_by(
+            Show.start_time.desc()).all()
+
+    @property
+    def upcoming_shows(self):
+        return Show.upcoming(Show.venue_id == self.id).order_by(
+            Show.start_time).all()
+
+    # TODO: implement any missing fields, as a database migration using
+    # Flask-Migrate
+
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    shows = db.relationship('Show', backref='artist', lazy=True)
+    genres = db.Column(Genres)
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = updated_at_column()
+
+    @property
+    def past_shows(self):
+        return Show.past(Show.artist_id == self.id).order_by(
+            Show.start_time.desc()).all()
+
+    @property
+    def upcoming_shows(self):
+        return Show.upcoming(Show.artist_id == self.id).order_by(
+            Show.start_time).all()
+
+
+def _starts_later(context):
+    return context.get_current_parameters()['start_time'] > datetime.now()
+
+
+def _default_end(context):
+    return booking.show_end(context.get_current_parameters()['start_time'])
+
+
+class Show(db.Model):
+    __tablename__ = 'Show'
+    # (venue_id, is_upcoming, start_time) and its artist twin answer the
+    # past and upcoming splits on the venue and artist pages with an index
+    # range scan already in start_time order; (venue_id, start_time) and
+    # (artist_id, start_time) serve the date-range calendars.
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_venue_id_is_upcoming_start_time', 'venue_id',
+                 'is_upcoming', 'start_time'),
+        db.Index('ix_Show_artist_id_is_upcoming_start_time', 'artist_id',
+                 'is_upcoming', 'start_time'),
+        db.Index('ix_Show_is_upcoming_start_time', 'is_upcoming',
+                 'start_time'),
+        db.CheckConstraint('end_time > start_time',
+                           name='ck_Show_end_after_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id'), nullable=False)
+
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id'), nullable=False)
+
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+
+    # Shows at one venue or by one artist may not overlap; see booking.py.
+    end_time = db.Column(db.DateTime, nullable=False, default=_default_end)
+
+    # Which counter the show is in; `flask rollover-shows` clears it once
+    # the show has started.
+    is_upcoming = db.Column(
+        db.Boolean, nullable=False, default=_starts_later,
+        server_default=db.true())
+
+    updated_at = updated_at_column()
+
+    @classmethod
+    def listing(cls, *criterion):
+        # Projects each show together with the artist and venue columns the
+        # templates render, so a list of shows costs one joined query
+        # instead of two lookups per show.
+        return db.session.query(
+            cls.id,
+            cls.venue_id,
+            cls.artist_id,
+            cls.start_time,
+            cls.end_time,
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link'),
+        ).join(Artist, cls.artist_id == Artist.id).join(
+            Venue, cls.venue_id == Venue.id).filter(*criterion)
+
+    # The venue and artist pages split shows on is_upcoming rather than the
+    # clock, so they agree with the counters and only change when a write
+    # (or the rollover) changes the database.
+    @classmethod
+    def past(cls, *criterion):
+        return cls.listing(cls.is_upcoming.is_(False), *criterion)
+
+    @classmethod
+    def upcoming(cls, *criterion):
+        return cls.listing(cls.is_upcoming.is_(True), *criterion)
+
+    @classmethod
+    def delete_where(cls, *criterion):
+        '''Deletes the matching shows and takes them off the counters.'''
+        query = db.session.query(
+            cls.venue_id, cls.artist_id, cls.is_upcoming).filter(*criterion)
+        counters.apply(db.session.connection(), Venue.__table__,
+                       Artist.__table__, query.all(), sign=-1)
+        query.delete(synchronize_session=False)
+
+
+def touch(model, ids):
+    '''Marks the given rows as changed, in the current transaction.'''
+    if ids:
+        db.session.query(model).filter(model.id.in_(ids)).update(
+            {model.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+
+# Listings sorted by popularity (?sort=popular) page through these.
+db.Index('ix_Venue_city_state_upcoming_shows_count_name_id', Venue.city,
+         Venue.state, Venue.upcoming_shows_count.desc(), Venue.name, Venue.id)
+db.Index('ix_Artist_upcoming_shows_count_name_id',
+         Artist.upcoming_shows_count.desc(), Artist.name, Artist.id)
+
+
+booking.exclude_overlaps(Show.__table__)
+
+
+@event.listens_for(Show, 'after_insert')
+def _count_inserted_show(mapper, connection, show):
+    counters.apply(connection, Venue.__table__, Artist.__table__,
+                   [(show.venue_id, show.artist_id, show.is_upcoming)])
+
+
+@event.listens_for(Show, 'after_delete')
+def _count_deleted_show(mapper, connection, show):
+    counters.apply(connection, Venue.__table__, Artist.__table__,
+                   [(show.venue_id, show.artist_id, show.is_upcoming)],
+                   sign=-1)
+
+
+venue_search = SearchIndex(db, Venue)
+artist_search = SearchIndex(db, Artist)
+venue_genres = GenreIndex(db, Venue)
+artist_genres = GenreIndex(db, Artist)
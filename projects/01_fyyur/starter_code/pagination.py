@@ -0,0 +1,140 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import DateTime, and_, or_, tuple_
+
+
+class Page(object):
+    '''One page of a keyset-paginated listing.'''
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values, backwards=False):
+    payload = json.dumps({
+        'k': [v.isoformat() if isinstance(v, datetime) else v
+              for v in values],
+        'b': backwards,
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, keys):
+    '''
+    Returns the key values and direction stored in `cursor`. Raises
+    ValueError for a cursor that was not produced for these keys.
+    '''
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(
+            cursor.encode('ascii')).decode('utf-8'))
+        values, backwards = payload['k'], bool(payload['b'])
+    except (TypeError, ValueError, KeyError, UnicodeError):
+        raise ValueError('malformed cursor')
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError('cursor does not match the listing order')
+    for i, (column, _) in enumerate(keys):
+        if values[i] is not None and isinstance(column.type, DateTime):
+            try:
+                values[i] = datetime.fromisoformat(values[i])
+            except (TypeError, ValueError):
+                raise ValueError('malformed cursor')
+    return values, backwards
+
+
+def _nullable(column):
+    return getattr(column, 'nullable', True)
+
+
+def _step(column, value, ascending):
+    # Rows whose `column` comes strictly after `value`. NULL sorts after
+    # every value in ascending order, as in postgres and its btree indexes,
+    # so it is the last value going forwards and the first going backwards.
+    if ascending:
+        if value is None:
+            return None
+        if _nullable(column):
+            return or_(column > value, column.is_(None))
+        return column > value
+    if value is None:
+        return column.isnot(None)
+    return column < value
+
+
+def _after(keys, values, backwards):
+    # Rows strictly after `values` in listing order (or strictly before them
+    # when paging backwards). A single row-value comparison lets the database
+    # seek straight into a composite index when all keys share a direction,
+    # but it is NULL when any key is, so nullable keys are compared one
+    # column at a time.
+    descending = set(desc for _, desc in keys)
+    if len(descending) == 1 and not any(
+            _nullable(column) for column, _ in keys):
+        columns = tuple_(*[column for column, _ in keys])
+        if descending.pop() != backwards:
+            return columns < tuple_(*values)
+        return columns > tuple_(*values)
+    clauses = []
+    for i, (column, desc) in enumerate(keys):
+        step = _step(column, values[i], desc == backwards)
+        if step is None:
+            continue
+        # `column == None` compiles to IS NULL
+        prefix = [c == v for (c, _), v in zip(keys[:i], values[:i])]
+        clauses.append(and_(*(prefix + [step])))
+    return or_(*clauses)
+
+
+def _ordering(keys, backwards):
+    ordering = []
+    for column, desc in keys:
+        if desc != backwards:
+            ordering.append(column.desc().nullsfirst()
+                            if _nullable(column) else column.desc())
+        else:
+            ordering.append(column.asc().nullslast()
+                            if _nullable(column) else column.asc())
+    return ordering
+
+
+def paginate(query, keys, cursor=None, per_page=20):
+    '''
+    Keyset pagination: fetches the `per_page` rows that follow (or precede)
+    `cursor` in the order given by `keys`, a list of `(column, descending)`
+    pairs whose last entry must be unique (normally the primary key). Each
+    page costs one index seek plus `per_page` rows, however deep into the
+    listing it is. NULL keys sort last (first when descending).
+    '''
+    keys = [key if isinstance(key, tuple) else (key, False) for key in keys]
+    backwards = False
+    if cursor:
+        values, backwards = decode_cursor(cursor, keys)
+        query = query.filter(_after(keys, values, backwards))
+
+    rows = query.order_by(*_ordering(keys, backwards)).limit(
+        per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row, backwards):
+        return encode_cursor(
+            [getattr(row, column.key) for column, _ in keys], backwards)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = cursor_for(rows[-1], False)
+        if cursor and (more or not backwards):
+            prev_cursor = cursor_for(rows[0], True)
+    return Page(rows, next_cursor, prev_cursor)
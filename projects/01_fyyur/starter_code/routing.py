@@ -0,0 +1,69 @@
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+
+# Name of the SQLALCHEMY_BINDS entry that serves read-only requests.
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(SignallingSession):
+    '''
+    Sends the queries of a read-only request to the replica bind and
+    everything else - writes, flushes, and any request after a recent write
+    by the same client - to the primary.
+    '''
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._use_replica():
+            state = self.app.extensions['sqlalchemy']
+            return state.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    def _use_replica(self):
+        if REPLICA_BIND not in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+            return False
+        if self._flushing or self.info.get('wrote'):
+            return False
+        return has_request_context() and g.get('db_read_only', False)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(db_session):
+    # Replicas lag; keep this client on the primary for a few seconds so the
+    # redirect after a form post shows what was just written.
+    if db_session.info.pop('wrote', False) and has_request_context():
+        seconds = db_session.app.config['REPLICA_STICKY_SECONDS']
+        session['_db_primary_until'] = time.time() + seconds
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(db_session):
+    db_session.info.pop('wrote', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    '''SQLAlchemy whose session routes read-only requests to a replica.'''
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    @staticmethod
+    def read_only(view):
+        '''
+        Marks a view as read-only, so its queries may be served by the
+        replica. Requests from a client that wrote within the last
+        REPLICA_STICKY_SECONDS still read from the primary.
+        '''
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.db_read_only = session.get('_db_primary_until', 0) < time.time()
+            return view(*args, **kwargs)
+        return wrapper
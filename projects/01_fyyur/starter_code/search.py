@@ -0,0 +1,135 @@
+import re
+
+from sqlalchemy import DDL, event, func, or_, text
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(term):
+    return TOKEN.findall((term or '').lower())
+
+
+# Postgres: one immutable function builds the weighted document for a row,
+# and an expression GIN index over it answers `@@` lookups. array_to_string
+# is only STABLE, so it is wrapped in a function declared IMMUTABLE to be
+# usable in the index expression.
+POSTGRES_DOCUMENT_FUNCTION = '''
+CREATE OR REPLACE FUNCTION fyyur_search_document(
+    name varchar, city varchar, state varchar, genres varchar[])
+RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+           setweight(to_tsvector('simple', coalesce(city, '') || ' ' ||
+                                           coalesce(state, '')), 'B') ||
+           setweight(to_tsvector('simple',
+                                 coalesce(array_to_string(genres, ' '), '')),
+                     'C')
+$$
+'''
+
+POSTGRES_INDEX = '''
+CREATE INDEX IF NOT EXISTS "ix_{table}_search" ON "{table}"
+USING gin (fyyur_search_document(name, city, state, genres))
+'''
+
+# SQLite: an external-content FTS5 table mirrors the searchable columns of
+# the model's table and is kept in sync by triggers.
+SQLITE_TABLE = '''
+CREATE VIRTUAL TABLE {index} USING fts5(
+    name, city, state, genres, content='{table}', content_rowid='id')
+'''
+
+SQLITE_TRIGGERS = (
+    '''
+CREATE TRIGGER {index}_ai AFTER INSERT ON "{table}" BEGIN
+    INSERT INTO {index}(rowid, name, city, state, genres)
+    VALUES (new.id, new.name, new.city, new.state, new.genres);
+END
+''',
+    '''
+CREATE TRIGGER {index}_ad AFTER DELETE ON "{table}" BEGIN
+    INSERT INTO {index}({index}, rowid, name, city, state, genres)
+    VALUES ('delete', old.id, old.name, old.city, old.state, old.genres);
+END
+''',
+    '''
+CREATE TRIGGER {index}_au AFTER UPDATE ON "{table}" BEGIN
+    INSERT INTO {index}({index}, rowid, name, city, state, genres)
+    VALUES ('delete', old.id, old.name, old.city, old.state, old.genres);
+    INSERT INTO {index}(rowid, name, city, state, genres)
+    VALUES (new.id, new.name, new.city, new.state, new.genres);
+END
+''',
+)
+
+SQLITE_QUERY = '''
+SELECT "{table}".* FROM "{table}"
+JOIN {index} ON {index}.rowid = "{table}".id
+WHERE {index} MATCH :query
+ORDER BY bm25({index}, 10.0, 5.0, 5.0, 2.0), "{table}".name
+LIMIT :limit
+'''
+
+
+class SearchIndex(object):
+    '''
+    Ranked, prefix-matching full-text search over the name, city, state and
+    genres of a Venue or Artist.
+
+    The index DDL is attached to the model's table, so `db.create_all()`
+    builds a GIN expression index on postgres and an FTS5 table on sqlite;
+    existing postgres databases get it from the migrations. Other dialects
+    fall back to a case-insensitive LIKE scan.
+    '''
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self.table = model.__tablename__
+        self.index = '{}_search'.format(self.table.lower())
+
+        names = {'table': self.table, 'index': self.index}
+        table = model.__table__
+        for statement in (POSTGRES_DOCUMENT_FUNCTION, POSTGRES_INDEX):
+            event.listen(table, 'after_create', DDL(
+                statement.format(**names)).execute_if(dialect='postgresql'))
+        for statement in (SQLITE_TABLE,) + SQLITE_TRIGGERS:
+            event.listen(table, 'after_create', DDL(
+                statement.format(**names)).execute_if(dialect='sqlite'))
+        event.listen(table, 'before_drop', DDL(
+            'DROP TABLE IF EXISTS {index}'.format(**names)).execute_if(
+                dialect='sqlite'))
+
+    def search(self, term, limit=100):
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        dialect = self.db.session.get_bind(self.model.__mapper__).dialect.name
+        if dialect == 'postgresql':
+            return self._search_postgresql(tokens, limit)
+        if dialect == 'sqlite':
+            return self._search_sqlite(tokens, limit)
+        return self._search_like(tokens, limit)
+
+    def _search_postgresql(self, tokens, limit):
+        model = self.model
+        document = func.fyyur_search_document(
+            model.name, model.city, model.state, model.genres)
+        query = func.to_tsquery('simple', ' & '.join(
+            "'{}':*".format(token) for token in tokens))
+        return model.query.filter(document.op('@@')(query)).order_by(
+            func.ts_rank(document, query).desc(), model.name).limit(
+                limit).all()
+
+    def _search_sqlite(self, tokens, limit):
+        statement = text(SQLITE_QUERY.format(
+            table=self.table, index=self.index))
+        query = ' '.join('"{}"*'.format(token) for token in tokens)
+        return self.model.query.from_statement(statement).params(
+            query=query, limit=limit).all()
+
+    def _search_like(self, tokens, limit):
+        model = self.model
+        criteria = [or_(*[func.lower(column).contains(token) for column in (
+            model.name, model.city, model.state)]) for token in tokens]
+        return model.query.filter(*criteria).order_by(
+            model.name).limit(limit).all()
@@ -0,0 +1,203 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# config.py reads these when create_app() loads it.
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['PAGE_CACHE_BACKEND'] = 'null'
+
+from app import create_app, page_cache  # noqa: E402
+from bulk_import import ShowImporter  # noqa: E402
+from cache import MemoryCache  # noqa: E402
+from formatting import format_datetime  # noqa: E402
+from instrumentation import assert_max_queries  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+
+
+class FyyurTestCase(unittest.TestCase):
+    """Runs the app against an in-memory sqlite database."""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def seed(self, venues=1, artists=1, shows=0):
+        """Adds venues and artists in two areas, then `shows` shows
+        spread over them, half in the past and half upcoming."""
+        for i in range(venues):
+            db.session.add(Venue(
+                name='Venue {}'.format(i), city=['San Francisco', 'New York'][
+                    i % 2], state=['CA', 'NY'][i % 2], genres=['Jazz']))
+        for i in range(artists):
+            db.session.add(Artist(
+                name='Artist {}'.format(i), city='San Francisco',
+                state='CA', genres=['Jazz']))
+        db.session.commit()
+        now = datetime.now()
+        for i in range(shows):
+            db.session.add(Show(
+                venue_id=1 + i % venues, artist_id=1 + i % artists,
+                start_time=now + timedelta(days=i - shows // 2, hours=1)))
+        db.session.commit()
+
+    def assertQueriesConstant(self, url, limit):
+        """Fails if `url` takes more than `limit` queries, with one show or
+        with many."""
+        for shows in (1, 40):
+            db.drop_all()
+            db.create_all()
+            self.seed(venues=4, artists=4, shows=shows)
+            with assert_max_queries(db.engine, limit):
+                res = self.client().get(url)
+            self.assertEqual(res.status_code, 200)
+
+    def test_venues_query_count(self):
+        self.assertQueriesConstant('/venues', 1)
+
+    def test_artists_query_count(self):
+        self.assertQueriesConstant('/artists', 1)
+
+    def test_venue_page_query_count(self):
+        self.assertQueriesConstant('/venues/1', 4)
+
+    def test_artist_page_query_count(self):
+        self.assertQueriesConstant('/artists/1', 4)
+
+    def test_shows_query_count(self):
+        self.assertQueriesConstant('/shows', 1)
+
+    def walk(self, url):
+        """Follows next_cursor through every page of `url`, then
+        prev_cursor back to the first, and returns both walks."""
+        headers = {'Accept': 'application/json'}
+        forward, cursor = [], None
+        while True:
+            data = self.client().get(
+                url + ('&cursor=' + cursor if cursor else ''),
+                headers=headers).get_json()
+            forward.append(data['data'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        backward, cursor = [], data['prev_cursor']
+        while cursor:
+            data = self.client().get(url + '&cursor=' + cursor,
+                                     headers=headers).get_json()
+            backward.insert(0, data['data'])
+            cursor = data['prev_cursor']
+        return forward, backward
+
+    def test_pagination_with_null_keys(self):
+        for i in range(3):
+            db.session.add(Venue(name='NoCity {}'.format(i)))
+            db.session.add(Venue(name='City {}'.format(i), city='Austin',
+                                 state='TX'))
+            db.session.add(Artist(name=None if i else 'Named'))
+            db.session.add(Artist(name='Artist {}'.format(i)))
+        db.session.commit()
+        forward, backward = self.walk('/venues?per_page=2')
+        names = [venue['name'] for page in forward
+                 for area in page for venue in area['venues']]
+        self.assertEqual(names, ['City 0', 'City 1', 'City 2',
+                                 'NoCity 0', 'NoCity 1', 'NoCity 2'])
+        self.assertEqual(backward, forward[:-1])
+        forward, backward = self.walk('/artists?per_page=2&sort=popular')
+        ids = [artist['id'] for page in forward for artist in page]
+        self.assertEqual(sorted(ids), list(range(1, 7)))
+        self.assertEqual(backward, forward[:-1])
+
+    def test_popular_venues_walk(self):
+        self.seed(venues=6, artists=2, shows=12)
+        forward, backward = self.walk('/venues?per_page=2&sort=popular')
+        self.assertGreater(len(forward), 2)
+        venues = [venue for page in forward
+                  for area in page for venue in area['venues']]
+        self.assertEqual(sorted(venue['id'] for venue in venues),
+                         list(range(1, 7)))
+        self.assertTrue(any(venue['num_upcoming_shows'] for venue in venues))
+        self.assertEqual(backward, forward[:-1])
+
+    def test_page_cache_follows_updated_at(self):
+        backend, page_cache.backend = page_cache.backend, MemoryCache()
+        self.addCleanup(setattr, page_cache, 'backend', backend)
+        self.seed()
+        first = self.client().get('/venues/1')
+        # written by another worker, so this process's cache is not told
+        Venue.query.filter_by(id=1).update({
+            'name': 'Renamed',
+            'updated_at': datetime.utcnow() + timedelta(seconds=1)})
+        db.session.commit()
+        res = self.client().get('/venues/1', headers={
+            'If-None-Match': first.headers['ETag']})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], first.headers['ETag'])
+        self.assertIn(b'Renamed', res.data)
+        res = self.client().get('/venues/1', headers={
+            'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+    def test_show_split_uses_index(self):
+        for split, column, index in (
+                (Show.past, Show.venue_id, 'venue_id_is_upcoming'),
+                (Show.upcoming, Show.artist_id, 'artist_id_is_upcoming')):
+            query = split(column == 1).order_by(Show.start_time)
+            plan = ' '.join(row[-1] for row in db.session.execute(
+                'EXPLAIN QUERY PLAN ' + str(query.statement.compile(
+                    db.engine, compile_kwargs={'literal_binds': True}))))
+            self.assertIn('ix_Show_{}_start_time'.format(index), plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_venue_page_lists_shows(self):
+        self.seed(shows=2)
+        res = self.client().get('/venues/1')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Artist 0', res.data)
+
+    def test_import_shows_with_offsets(self):
+        self.seed()
+        rows = ['venue_id,artist_id,start_time',
+                '1,1,2030-01-01T12:00:00Z',
+                '1,1,2030-01-02T12:00:00+02:00']
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', delete=False) as f:
+            f.write('\n'.join(rows) + '\n')
+        self.addCleanup(os.remove, f.name)
+        stats = ShowImporter(db, Show.__table__, Venue.__table__,
+                             Artist.__table__).run(f.name)
+        self.assertEqual((stats.inserted, stats.invalid), (2, 0))
+        expected = [datetime.fromisoformat(row.split(',')[2].replace(
+            'Z', '+00:00')).astimezone().replace(tzinfo=None)
+            for row in rows[1:]]
+        self.assertEqual([show.start_time for show in
+                          Show.query.order_by(Show.start_time)], expected)
+        self.assertEqual(Venue.query.get(1).upcoming_shows_count, 2)
+
+    def test_calendar_of_unknown_id(self):
+        self.seed(shows=2)
+        for url in ('/venues/{}/calendar', '/venues/{}/calendar.ics',
+                    '/artists/{}/calendar', '/artists/{}/calendar.ics'):
+            self.assertEqual(self.client().get(url.format(1)).status_code,
+                             200)
+            self.assertEqual(self.client().get(url.format(99)).status_code,
+                             404)
+
+    def test_format_datetime_keeps_offsets(self):
+        self.assertEqual(format_datetime('2020-01-01T12:00:00+00:00'),
+                         'Wed 01, 01, 2020 12:00PM')
+        self.assertEqual(format_datetime('2020-01-01T13:00:00+01:00'),
+                         'Wed 01, 01, 2020 1:00PM')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
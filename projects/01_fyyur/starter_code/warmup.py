@@ -0,0 +1,48 @@
+import gc
+
+from sqlalchemy.orm import configure_mappers
+
+
+def precompile_templates(app):
+    '''Compiles every template into the Jinja environment's cache.'''
+    env = app.jinja_env
+    for name in env.list_templates(extensions=['html']):
+        env.get_template(name)
+
+
+def engines(app):
+    state = app.extensions['sqlalchemy']
+    binds = [None] + list(app.config.get('SQLALCHEMY_BINDS') or ())
+    return [state.db.get_engine(app, bind=bind) for bind in binds]
+
+
+def before_fork(app):
+    '''
+    Does the per-process start-up work once in a preforking server's parent:
+    templates are compiled and mappers configured, so workers inherit them
+    copy-on-write instead of each repeating it. Pooled connections are
+    closed first, since a socket must never be shared across a fork, and
+    the surviving objects are frozen out of the cyclic GC so collections in
+    the workers do not touch (and copy) the parent's pages.
+    '''
+    with app.app_context():
+        precompile_templates(app)
+        configure_mappers()
+        for engine in engines(app):
+            engine.dispose()
+    if hasattr(gc, 'freeze'):  # python 3.7+
+        gc.freeze()
+
+
+def after_fork(app):
+    '''
+    Gives a new worker its own connection pools, opening DB_POOL_PREOPEN
+    connections to each database ahead of the first request.
+    '''
+    count = app.config.get('DB_POOL_PREOPEN', 0)
+    with app.app_context():
+        for engine in engines(app):
+            engine.dispose()
+            connections = [engine.connect() for _ in range(count)]
+            for connection in connections:
+                connection.close()
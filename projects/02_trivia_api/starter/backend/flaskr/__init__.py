@@ -1,21 +1,108 @@
 import os
-from flask import Flask, request, abort, jsonify
+import secrets
+from flask import Flask, request, abort, jsonify, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS, cross_origin
-import random
 
-from models import setup_db, Question, Category, db
+from models import setup_db, on_change, Question, Category, db
+from .cache import CachedValue
+from .quiz import QuestionPool, QuizSession
+from .search import SearchIndex
+from .store import make_store
 
 QUESTIONS_PER_PAGE = 10
 
+# Seconds the total question count is served from memory. Questions added
+# or deleted through this app adjust it at once; the TTL covers other
+# processes writing to the same database.
+QUESTION_COUNT_TTL = 60
+
+# Seconds the categories are served from memory. Categories written through
+# this app are reloaded on the next read.
+CATEGORY_CACHE_TTL = 300
+
+# Seconds between full reloads of the question ids quizzes are dealt from,
+# which run in the background. Writes through this app update them at once.
+QUESTION_POOL_TTL = 300
+
+# Seconds between full rebuilds of the question search index, which run in
+# the background. Writes through this app update it at once.
+SEARCH_INDEX_TTL = 600
+
+# Best matches returned by a search; total_questions counts them all.
+SEARCH_RESULTS_LIMIT = 100
+
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    if test_config is not None:
+        app.config.update(test_config)
     setup_db(app)
 
     cors = CORS(app, resources={r"/*": {"origins": "*"}})
 
+    question_count = CachedValue(
+        lambda: Question.query.count(), QUESTION_COUNT_TTL)
+
+    def load_categories():
+        # the formatted list and an id -> type map, built once per load
+        formatted = [c.format()
+                     for c in Category.query.order_by(Category.id).all()]
+        return formatted, {c['id']: c['type'] for c in formatted}
+
+    categories = CachedValue(load_categories, CATEGORY_CACHE_TTL)
+
+    def in_app_context(query):
+        # the in-memory indexes reload from a background thread, outside
+        # any request
+        def load():
+            if has_app_context():
+                return query()
+            with app.app_context():
+                return query()
+        return load
+
+    question_pool = QuestionPool(in_app_context(
+        lambda: db.session.query(Question.id, Question.category).all()),
+        QUESTION_POOL_TTL)
+    # SEARCH_SNAPSHOT names a file the index is saved to after each
+    # rebuild and restored from when the app starts
+    search_index = SearchIndex(in_app_context(
+        lambda: db.session.query(
+            Question.id, Question.question, Question.answer).all()),
+        SEARCH_INDEX_TTL, app.config.get('SEARCH_SNAPSHOT'))
+    # quiz sessions, by default in memory; QUIZ_STORE=filesystem with
+    # QUIZ_STORE_DIR shares them between the processes on a host
+    quizzes = make_store(app.config)
+    app.extensions['trivia_cache'] = {
+        'question_count': question_count,
+        'categories': categories,
+        'search_index': search_index,
+    }
+
+    def follow_writes(action, record):
+        if isinstance(record, Category):
+            categories.invalidate()
+            return
+        # an update may have moved the question to another category
+        question_pool.remove(record.id)
+        if action == 'delete':
+            search_index.remove(record.id)
+        else:
+            question_pool.add(record.id, record.category)
+            search_index.add(record.id, record.question, record.answer)
+        if action != 'update':
+            step = 1 if action == 'insert' else -1
+            question_count.update(lambda count: count + step)
+
+    on_change(app, follow_writes)
+
+    @app.before_first_request
+    def build_search_index():
+        if not search_index.restore():
+            search_index.refresh()
+
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Headers',
@@ -27,8 +114,7 @@ def create_app(test_config=None):
 
     @app.route('/categories', methods=['GET'])
     def get_categories():
-        categories = Category.query.all()
-        formatted_categories = [c.format() for c in categories]
+        formatted_categories, _ = categories.get()
         return jsonify({
             "success": True,
             "categories": formatted_categories,
@@ -37,21 +123,32 @@ def create_app(test_config=None):
 
     @app.route('/questions', methods=['GET'])
     def get_questions():
+        # Pages are read in id order straight from the database: ?page=N
+        # with LIMIT/OFFSET, or ?cursor=<next_cursor of the previous page>,
+        # which seeks past the last id seen and so costs the same however
+        # deep the page is.
         page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
+        cursor = request.args.get('cursor', type=int)
+        if page < 1:
+            abort(422)
 
-        categories = Category.query.all()
-        formatted_categories = [c.format() for c in categories]
+        query = Question.query.order_by(Question.id)
+        if cursor is not None:
+            query = query.filter(Question.id > cursor)
+        else:
+            query = query.offset((page - 1) * QUESTIONS_PER_PAGE)
+        # one extra row tells whether there is a next page
+        questions = query.limit(QUESTIONS_PER_PAGE + 1).all()
+        has_next = len(questions) > QUESTIONS_PER_PAGE
+        questions = questions[:QUESTIONS_PER_PAGE]
+        formatted_categories, _ = categories.get()
 
-        questions = Question.query.all()
-        formatted_questions = [q.format() for q in questions]
         return jsonify({
             "success": True,
-            "questions": formatted_questions[start:end],
+            "questions": [q.format() for q in questions],
             "categories": formatted_categories,
-            "total_questions": len(formatted_questions),
-
+            "total_questions": question_count.get(),
+            "next_cursor": questions[-1].id if has_next else None
         })
 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
@@ -98,17 +195,32 @@ def create_app(test_config=None):
     @app.route('/questions/search', methods=['POST'])
     def search_questions():
         search_term = request.json['searchTerm']
-        search_results = Question.query.filter(
-            Question.question.ilike('%' + search_term + '%')).all()
+        total, question_ids = search_index.search(
+            search_term, SEARCH_RESULTS_LIMIT)
+        if question_ids is None:
+            # nothing to look up in the index, such as punctuation only
+            search_results = Question.query.filter(
+                Question.question.ilike('%' + search_term + '%')).all()
+            total = len(search_results)
+        elif question_ids:
+            questions = {q.id: q for q in Question.query.filter(
+                Question.id.in_(question_ids)).all()}
+            search_results = [questions[question_id]
+                              for question_id in question_ids
+                              if question_id in questions]
+        else:
+            search_results = []
         formatted_search_results = [r.format() for r in search_results]
         return jsonify({
             "success": True,
             "questions": formatted_search_results,
-            "total_questions": len(formatted_search_results)
+            "total_questions": total
         })
 
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
     def get_category_questions(category_id):
+        _, category_types = categories.get()
+        current_category = category_types.get(category_id)
         category_id = str(category_id)
         questions = Question.query.filter_by(category=category_id).all()
         formatted_questions = [q.format() for q in questions]
@@ -116,7 +228,8 @@ def create_app(test_config=None):
             "success": True,
             "questions": formatted_questions,
             "total_questions": len(formatted_questions),
-            "currentCategory": category_id
+            "currentCategory": category_id,
+            "current_category": current_category
         })
 
     @app.route('/play', methods=['POST'])
@@ -124,28 +237,75 @@ def create_app(test_config=None):
 
         category_id = str(
             request.json['quizCategory']) if 'quizCategory' in request.json else None
-        previous_question_ids = (request.json['previousQuestions']
-                                 if 'previousQuestions' in request.json
-                                 else None)
-
-        choices = (
-            Question.query.filter(
-                Question.id.notin_(previous_question_ids)).filter(
-                Question.category == category_id).all() if category_id and previous_question_ids else Question.query.filter(
-                Question.id.notin_(previous_question_ids)).all() if previous_question_ids else Question.query.filter(
-                    Question.category == category_id).all() if category_id else Question.query.all())
-
-        if len(choices) > 0:
-            selected_question = random.choice(choices)
-            formatted_question = selected_question.format()
-            return jsonify({
-                "success": True,
-                "question": formatted_question,
-            })
+        previous_question_ids = set(request.json.get('previousQuestions')
+                                    or ())
+
+        selected_question = draw_question(category_id, previous_question_ids)
+        return jsonify({
+            "success": True,
+            "question": (selected_question.format()
+                         if selected_question else False),
+        })
+
+    def draw_question(category_id, seen, shuffle=None):
+        # the id is dealt from memory; only the chosen question is read
+        while True:
+            question_id = question_pool.deal(category_id, shuffle, seen)
+            if question_id is None:
+                return None
+            question = Question.query.get(question_id)
+            if question is not None:
+                return question
+            # deleted by another process since the last reload
+            question_pool.remove(question_id)
+
+    def load_quiz(quiz_id):
+        data = quizzes.get(quiz_id)
+        if data is None:
+            abort(404)
+        try:
+            return QuizSession.loads(data)
+        except ValueError:
+            abort(404)
+
+    @app.route('/quizzes', methods=['POST'])
+    def start_quiz():
+        # Quiz progress is kept server side, so each turn sends only the
+        # quiz id rather than every question asked so far.
+        body = request.get_json(silent=True) or {}
+        category_id = body.get('quizCategory')
+        if category_id is not None and (
+                not isinstance(category_id, int)
+                or isinstance(category_id, bool)
+                or category_id not in categories.get()[1]):
+            abort(422)
+        quiz_id = secrets.token_urlsafe(16)
+        quizzes.set(quiz_id, QuizSession(category_id).dumps())
+        return jsonify({
+            "success": True,
+            "quiz_id": quiz_id
+        })
+
+    @app.route('/quizzes/<quiz_id>/next', methods=['POST'])
+    def next_quiz_question(quiz_id):
+        quiz = load_quiz(quiz_id)
+        question = draw_question(quiz.category, quiz.seen, quiz.shuffle)
+        if question is not None:
+            quiz.seen.add(question.id)
+        quizzes.set(quiz_id, quiz.dumps())
+        return jsonify({
+            "success": True,
+            "question": question.format() if question else False,
+            "questions_asked": len(quiz.seen)
+        })
 
+    @app.route('/quizzes/<quiz_id>', methods=['DELETE'])
+    def finish_quiz(quiz_id):
+        quiz = load_quiz(quiz_id)
+        quizzes.delete(quiz_id)
         return jsonify({
             "success": True,
-            "question": False,
+            "questions_asked": len(quiz.seen)
         })
 
     @app.errorhandler(404)
@@ -0,0 +1,138 @@
+import threading
+import time
+
+
+class CachedValue(object):
+    '''
+    A value computed by `load()` and kept for up to `ttl` seconds.
+
+    Writes made through this process adjust or invalidate it directly, and
+    each one bumps `version`; the TTL only bounds how stale it can get when
+    another process writes. `hits` and `misses` count the reads served from
+    memory and those that called `load()`.
+    '''
+
+    def __init__(self, load, ttl):
+        self.load = load
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires = 0
+
+    def get(self):
+        with self._lock:
+            if self._expires > time.time():
+                self.hits += 1
+                return self._value
+            self.misses += 1
+            version = self.version
+        value = self.load()
+        with self._lock:
+            # a load that raced a write may have read the old rows
+            if version == self.version:
+                self._value = value
+                self._expires = time.time() + self.ttl
+        return value
+
+    def update(self, change):
+        '''Applies change(value) to the cached value, if there is one.'''
+        with self._lock:
+            self.version += 1
+            if self._expires > time.time():
+                self._value = change(self._value)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._expires = 0
+
+
+class LoadedIndex(object):
+    '''
+    An in-memory structure over a whole table, built by `build(rows)` from
+    the rows `load()` returns and kept current by the writes this process
+    makes through `change()`. It is rebuilt every `ttl` seconds to pick up
+    other processes' writes.
+
+    Only the first build makes readers wait. Later rebuilds run in a
+    background thread, started by the first read that finds the index
+    expired, while reads keep using the current state; changes made
+    meanwhile are replayed onto the rebuild. `load()` is called from that
+    thread, so it must not depend on the caller's context. Subclasses read
+    `_state` under `_lock`.
+    '''
+
+    def __init__(self, load, ttl):
+        self.load = load
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._state = self.build(())
+        self._loaded = False
+        self._expires = 0
+        # changes made while a rebuild reads the table
+        self._pending = None
+
+    def build(self, rows):
+        raise NotImplementedError
+
+    def built(self, state):
+        '''Called with each rebuilt state before it is published.'''
+
+    def prime(self, state):
+        '''Serves `state`, e.g. one saved by built(), as a fresh build.'''
+        with self._lock:
+            self._state = state
+            self._loaded = True
+            self._expires = time.time() + self.ttl
+
+    def refresh(self):
+        if self._expires > time.time():
+            return
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._rebuild()
+            return
+        if not self._load_lock.acquire(False):
+            return
+        if self._expires > time.time():
+            self._load_lock.release()
+            return
+        thread = threading.Thread(target=self._rebuild_in_background)
+        thread.daemon = True
+        thread.start()
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        finally:
+            self._load_lock.release()
+
+    def _rebuild(self):
+        with self._lock:
+            self._pending = []
+        try:
+            state = self.build(self.load())
+            self.built(state)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for change in self._pending:
+                change(state)
+            self._state = state
+            self._pending = None
+            self._loaded = True
+            self._expires = time.time() + self.ttl
+
+    def change(self, change):
+        '''Applies change(state) now and to a rebuild in progress.'''
+        with self._lock:
+            change(self._state)
+            if self._pending is not None:
+                self._pending.append(change)
@@ -0,0 +1,205 @@
+import random
+import struct
+
+from .cache import LoadedIndex
+
+
+def new_generation():
+    # random rather than counted, so that the generations of the pools in
+    # different processes sharing a quiz store never coincide
+    return random.getrandbits(63)
+
+
+class QuestionPool(LoadedIndex):
+    '''
+    The question ids of each category, and of all of them under None, kept
+    in arrays that quiz questions are dealt from at random. `load()`
+    returns (id, category) rows.
+
+    Each id's position in its arrays is tracked, so adding a question is an
+    append and removing one moves the last id into its slot: both O(1).
+    The pool's generation changes whenever ids change position, that is on
+    a removal or a rebuild; an append keeps it.
+    '''
+
+    # state is (arrays, positions, generation), the generation in a
+    # one-element list so that removals can replace it in place
+    def build(self, rows):
+        arrays, positions = {None: []}, {}
+        for id, category in rows:
+            self._insert(arrays, positions, None, id, category)
+        return arrays, positions, [new_generation()]
+
+    # positions[id] is [category, slot in arrays[None], slot in
+    # arrays[category]]
+    @staticmethod
+    def _insert(arrays, positions, generation, id, category):
+        if id in positions:
+            return
+        category = str(category)
+        everything = arrays[None]
+        ids = arrays.get(category)
+        if ids is None:
+            ids = arrays[category] = []
+        positions[id] = [category, len(everything), len(ids)]
+        everything.append(id)
+        ids.append(id)
+
+    @staticmethod
+    def _delete(arrays, positions, generation, id):
+        position = positions.pop(id, None)
+        if position is None:
+            return
+        for key, index in ((None, 1), (position[0], 2)):
+            ids = arrays[key]
+            last = ids.pop()
+            if last != id:
+                ids[position[index]] = last
+                positions[last][index] = position[index]
+        generation[0] = new_generation()
+
+    def add(self, id, category):
+        self.change(lambda state: self._insert(*state, id, category))
+
+    def remove(self, id):
+        self.change(lambda state: self._delete(*state, id))
+
+    def deal(self, category=None, shuffle=None, seen=(), rnd=random):
+        '''
+        Returns the next id of `category` (any category for None) in the
+        random order of `shuffle` that is not in the set `seen`, or None
+        once they have all been seen. Each id costs O(1) however many have
+        been dealt, as long as the pool keeps its generation. When it has
+        changed, ids may have moved into positions already dealt, so an
+        exhausted shuffle starts over once, skipping the ids seen.
+        '''
+        self.refresh()
+        key = None if category is None else str(category)
+        shuffle = shuffle if shuffle is not None else Shuffle()
+        with self._lock:
+            arrays, _, generation = self._state
+            ids = arrays.get(key) or ()
+            if shuffle.generation is None:
+                shuffle.generation = generation[0]
+            while True:
+                position = shuffle.next(len(ids), rnd)
+                if position is None:
+                    if shuffle.generation == generation[0]:
+                        return None
+                    shuffle.restart(generation[0])
+                elif position < len(ids) and ids[position] not in seen:
+                    return ids[position]
+
+
+class Shuffle(object):
+    '''
+    A random order over the positions of an array, dealt one at a time by
+    a Fisher-Yates shuffle that only stores the positions it has swapped:
+    dealing is O(1), and after k deals at most k swaps are kept. The array
+    may grow between deals; `generation` is that of the pool the positions
+    refer to.
+    '''
+
+    def __init__(self, dealt=0, swaps=None, generation=None):
+        self.dealt = dealt
+        self.swaps = swaps if swaps is not None else {}
+        self.generation = generation
+
+    def next(self, length, rnd=random):
+        '''The next position below `length`, or None once all are dealt.'''
+        i = self.dealt
+        if i >= length:
+            return None
+        j = rnd.randrange(i, length)
+        # position i is never read again, so only j keeps a swap
+        at_i = self.swaps.pop(i, i)
+        if j == i:
+            position = at_i
+        else:
+            position = self.swaps.get(j, j)
+            self.swaps[j] = at_i
+        self.dealt += 1
+        return position
+
+    def restart(self, generation):
+        self.dealt = 0
+        self.swaps = {}
+        self.generation = generation
+
+
+class Bitset(object):
+    '''
+    A set of non-negative ints as 64-bit words, keeping only the nonzero
+    ones: membership is O(1) and a quiz that has seen k questions takes at
+    most 12 bytes per question however large the ids are.
+    '''
+
+    WORD = struct.Struct('<IQ')
+
+    def __init__(self, words=None):
+        self.words = words or {}
+
+    def add(self, n):
+        self.words[n >> 6] = self.words.get(n >> 6, 0) | (1 << (n & 63))
+
+    def __contains__(self, n):
+        return bool(self.words.get(n >> 6, 0) >> (n & 63) & 1)
+
+    def __len__(self):
+        return sum(bin(word).count('1') for word in self.words.values())
+
+    def to_bytes(self):
+        return b''.join(self.WORD.pack(index, word)
+                        for index, word in sorted(self.words.items()))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(dict(cls.WORD.iter_unpack(data)))
+
+
+class QuizSession(object):
+    '''
+    A quiz in progress: its category (None for all of them), the order
+    questions are dealt in and the questions already asked, stored as
+    bytes under the quiz id.
+    '''
+
+    # sessions written in another layout (before an upgrade) do not start
+    # with this and are treated as missing
+    MAGIC = b'Q2'
+    HEADER = struct.Struct('<2siIqI')
+    SWAP = struct.Struct('<II')
+
+    def __init__(self, category=None, seen=None, shuffle=None):
+        self.category = category
+        self.seen = seen if seen is not None else Bitset()
+        self.shuffle = shuffle if shuffle is not None else Shuffle()
+
+    def dumps(self):
+        category = -1 if self.category is None else self.category
+        generation = self.shuffle.generation
+        swaps = self.shuffle.swaps
+        return b''.join([
+            self.HEADER.pack(self.MAGIC, category, self.shuffle.dealt,
+                             -1 if generation is None else generation,
+                             len(swaps)),
+            b''.join(self.SWAP.pack(*swap) for swap in swaps.items()),
+            self.seen.to_bytes()])
+
+    @classmethod
+    def loads(cls, data):
+        '''Raises ValueError for data that is not a session.'''
+        try:
+            magic, category, dealt, generation, count = \
+                cls.HEADER.unpack_from(data)
+            if magic != cls.MAGIC:
+                raise ValueError('not a quiz session')
+            offset = cls.HEADER.size
+            end = offset + count * cls.SWAP.size
+            swaps = dict(cls.SWAP.iter_unpack(data[offset:end]))
+            seen = Bitset.from_bytes(data[end:])
+        except struct.error as e:
+            raise ValueError(str(e))
+        shuffle = Shuffle(dealt, swaps,
+                          None if generation < 0 else generation)
+        return cls(None if category < 0 else category, seen, shuffle)
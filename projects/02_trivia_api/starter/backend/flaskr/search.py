@@ -0,0 +1,153 @@
+import heapq
+import os
+import pickle
+import re
+import tempfile
+from bisect import bisect_left
+from collections import Counter
+
+from .cache import LoadedIndex
+
+WORD = re.compile(r'\w+')
+
+# Bumped whenever the layout of the index state changes, so a snapshot
+# written by an older version is rebuilt instead of loaded.
+SNAPSHOT_VERSION = 1
+
+
+def tokenize(text):
+    return WORD.findall((text or '').casefold())
+
+
+class SearchIndex(LoadedIndex):
+    '''
+    Inverted index over question and answer text. `load()` returns
+    (id, question, answer) rows.
+
+    Words are case-folded. Each word of a query matches the indexed words
+    it is a prefix of, found by bisecting the sorted vocabulary. Questions
+    must match every query word and are ranked by how often the matched
+    words occur in them.
+
+    When `snapshot` names a file, every rebuild is saved there and
+    restore() loads it, so a restarted process answers searches without
+    reading the table.
+    '''
+
+    def __init__(self, load, ttl, snapshot=None):
+        self.snapshot = snapshot
+        super(SearchIndex, self).__init__(load, ttl)
+
+    # state is (postings, documents, vocabulary): postings[word] maps ids
+    # to the word's count in that question, documents[id] is the distinct
+    # words of the question and vocabulary is every word, sorted.
+    def build(self, rows):
+        postings, documents = {}, {}
+        for id, question, answer in rows:
+            counts = Counter(tokenize(question) + tokenize(answer))
+            documents[id] = tuple(counts)
+            for word, count in counts.items():
+                postings.setdefault(word, {})[id] = count
+        return postings, documents, sorted(postings)
+
+    @staticmethod
+    def _insert(postings, documents, vocabulary, id, question, answer):
+        counts = Counter(tokenize(question) + tokenize(answer))
+        documents[id] = tuple(counts)
+        for word, count in counts.items():
+            posting = postings.get(word)
+            if posting is None:
+                posting = postings[word] = {}
+                vocabulary.insert(bisect_left(vocabulary, word), word)
+            posting[id] = count
+
+    @staticmethod
+    def _delete(postings, documents, vocabulary, id):
+        words = documents.pop(id, None)
+        if words is None:
+            return
+        for word in words:
+            posting = postings[word]
+            del posting[id]
+            if not posting:
+                del postings[word]
+                del vocabulary[bisect_left(vocabulary, word)]
+
+    def add(self, id, question, answer):
+        '''Indexes a new question, or the new text of an existing one.'''
+        def change(state):
+            self._delete(*state, id)
+            self._insert(*state, id, question, answer)
+        self.change(change)
+
+    def remove(self, id):
+        self.change(lambda state: self._delete(*state, id))
+
+    def search(self, query, limit=None):
+        '''
+        Returns how many questions match `query` and the ids of the best
+        `limit` of them (all for None), best first. Returns (0, None) if
+        the query has no words to look up.
+        '''
+        words = set(tokenize(query))
+        if not words:
+            return 0, None
+        self.refresh()
+        with self._lock:
+            postings, _, vocabulary = self._state
+            matches = []
+            for word in words:
+                start = i = bisect_left(vocabulary, word)
+                while (i < len(vocabulary) and
+                       vocabulary[i].startswith(word)):
+                    i += 1
+                if start == i:
+                    return 0, []
+                if i - start == 1:
+                    scores = dict(postings[vocabulary[start]])
+                else:
+                    scores = {}
+                    for matched in vocabulary[start:i]:
+                        for id, count in postings[matched].items():
+                            scores[id] = scores.get(id, 0) + count
+                matches.append(scores)
+        # intersect starting from the rarest word
+        matches.sort(key=len)
+        scores = matches[0]
+        for other in matches[1:]:
+            scores = {id: score + other[id]
+                      for id, score in scores.items() if id in other}
+
+        def rank(id):
+            return -scores[id], id
+        if limit is None:
+            return len(scores), sorted(scores, key=rank)
+        return len(scores), heapq.nsmallest(limit, scores, key=rank)
+
+    def built(self, state):
+        if not self.snapshot:
+            return
+        directory = os.path.dirname(os.path.abspath(self.snapshot))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((SNAPSHOT_VERSION, state), f,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.snapshot)
+
+    def restore(self):
+        '''
+        Serves the snapshot, if there is a usable one, as if it had just
+        been built: the table is first read by the background rebuild a
+        `ttl` later. Returns whether it did.
+        '''
+        if not self.snapshot:
+            return False
+        try:
+            with open(self.snapshot, 'rb') as f:
+                version, state = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.PickleError):
+            return False
+        if version != SNAPSHOT_VERSION:
+            return False
+        self.prime(state)
+        return True
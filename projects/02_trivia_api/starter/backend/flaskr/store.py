@@ -0,0 +1,107 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryStore(object):
+    '''
+    In-process store of byte strings: least recently used keys are dropped
+    beyond `maxsize`, and every key expires `ttl` seconds after it was
+    last written.
+    '''
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileSystemStore(object):
+    '''
+    Store shared by every process on a host, one file per key in
+    `directory`. Stands in locally for a shared store such as Redis:
+    whichever worker serves the next request sees what another wrote.
+    Files older than `ttl` seconds are treated as missing, and swept up
+    at most once a `ttl`.
+    '''
+
+    def __init__(self, directory, ttl=3600):
+        self.directory = directory
+        self.ttl = ttl
+        self._pruned = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                self.delete(key)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        os.replace(tmp, self._path(key))
+        if self._pruned + self.ttl < time.time():
+            self._prune()
+
+    def _prune(self):
+        self._pruned = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime + self.ttl < self._pruned:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+def make_store(config):
+    store = config.get('QUIZ_STORE', 'memory')
+    ttl = config.get('QUIZ_TTL', 3600)
+    if store == 'memory':
+        return MemoryStore(config.get('QUIZ_STORE_SIZE', 10000), ttl)
+    if store == 'filesystem':
+        return FileSystemStore(config['QUIZ_STORE_DIR'], ttl)
+    raise ValueError('unknown QUIZ_STORE: {}'.format(store))
@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import Column, String, Integer, create_engine
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -22,6 +23,23 @@ def setup_db(app, database_path=database_path):
     db.create_all()
 
 
+'''
+on_change(app, callback)
+    calls callback(action, record) after a record is committed through its
+    insert(), update() or delete() method in the given app, so in-process
+    caches can follow the writes made there
+'''
+
+
+def on_change(app, callback):
+    app.extensions.setdefault('trivia_listeners', []).append(callback)
+
+
+def notify(action, record):
+    for callback in current_app.extensions.get('trivia_listeners', ()):
+        callback(action, record)
+
+
 '''
 Question
 
@@ -46,13 +64,16 @@ class Question(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        notify('insert', self)
 
     def update(self):
         db.session.commit()
+        notify('update', self)
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        notify('delete', self)
 
     def format(self):
         return {
@@ -79,6 +100,20 @@ class Category(db.Model):
     def __init__(self, type):
         self.type = type
 
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+        notify('insert', self)
+
+    def update(self):
+        db.session.commit()
+        notify('update', self)
+
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
+        notify('delete', self)
+
     def format(self):
         return {
             'id': self.id,
@@ -1,9 +1,15 @@
 import os
+import random
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
+from flaskr.quiz import Bitset, QuestionPool, Shuffle
 from models import setup_db, Question, Category
 
 
@@ -46,11 +52,35 @@ class TriviaTestCase(unittest.TestCase):
         res = self.client().get('/categories')
         self.assertEqual(res.status_code, 200)
 
+    def test_categories_cached(self):
+        cache = self.app.extensions['trivia_cache']['categories']
+        self.client().get('/categories')
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+
+    def test_category_write_invalidates_cache(self):
+        cache = self.app.extensions['trivia_cache']['categories']
+        self.client().get('/categories')
+        version = cache.version
+        with self.app.app_context():
+            category = Category(type='Test')
+            category.insert()
+            data = json.loads(self.client().get('/categories').data)
+            self.assertEqual(data['total_categories'], 7)
+            category.delete()
+        data = json.loads(self.client().get('/categories').data)
+        self.assertEqual(data['total_categories'], 6)
+        self.assertEqual(cache.version, version + 2)
+
     def test_questions_by_id(self):
         res = self.client().get('/categories/1/questions')
         data = json.loads(res.data)
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['total_questions'], 3)
+        self.assertEqual(data['current_category'], 'Science')
 
     def test_questions_paginated(self):
         res = self.client().get('/questions')
@@ -58,6 +88,43 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['success'])
 
+    def test_questions_second_page(self):
+        res = self.client().get('/questions?page=2')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['questions']), 9)
+        self.assertEqual(data['total_questions'], 19)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_questions_cursor(self):
+        first = json.loads(self.client().get('/questions').data)
+        res = self.client().get(
+            '/questions?cursor={}'.format(first['next_cursor']))
+        data = json.loads(res.data)
+        second = json.loads(self.client().get('/questions?page=2').data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(first['questions']), 10)
+        self.assertEqual(data['questions'], second['questions'])
+
+    def test_questions_invalid_page(self):
+        res = self.client().get('/questions?page=0')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_total_questions_follows_writes(self):
+        client = self.client()
+        total = json.loads(client.get('/questions').data)['total_questions']
+        res = client.post('/questions', json={
+            'question': 'Test question', 'answer': 'Test answer',
+            'difficult': 1, 'category': 1})
+        question_id = json.loads(res.data)['request']['id']
+        data = json.loads(client.get('/questions').data)
+        self.assertEqual(data['total_questions'], total + 1)
+        client.delete('/questions/{}'.format(question_id))
+        data = json.loads(client.get('/questions').data)
+        self.assertEqual(data['total_questions'], total)
+
     def test_questions_by_id_fail(self):
         res = self.client().get('/categories/500/questions')
         data = json.loads(res.data)
@@ -85,6 +152,88 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertEqual(data['total_questions'], 0)
 
+    def test_search_answers_by_prefix(self):
+        res = self.client().post('/questions/search', json={
+            'searchTerm': 'SCAR'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([q['id'] for q in data['questions']], [23])
+
+    def test_search_ranking_follows_writes(self):
+        client = self.client()
+        res = client.post('/questions', json={
+            'question': 'Cup, cup or cup?', 'answer': 'Cup',
+            'difficult': 1, 'category': 6})
+        question_id = json.loads(res.data)['request']['id']
+        data = json.loads(client.post('/questions/search', json={
+            'searchTerm': 'world cup'}).data)
+        self.assertEqual([q['id'] for q in data['questions']], [10, 11])
+        data = json.loads(client.post('/questions/search', json={
+            'searchTerm': 'cup'}).data)
+        self.assertEqual(data['total_questions'], 3)
+        self.assertEqual(data['questions'][0]['id'], question_id)
+        with self.app.app_context():
+            question = Question.query.get(question_id)
+            question.question = 'Zebra?'
+            question.update()
+        data = json.loads(client.post('/questions/search', json={
+            'searchTerm': 'zeb'}).data)
+        self.assertEqual(data['total_questions'], 1)
+        client.delete('/questions/{}'.format(question_id))
+        data = json.loads(client.post('/questions/search', json={
+            'searchTerm': 'cup'}).data)
+        self.assertEqual(data['total_questions'], 2)
+
+    def test_search_snapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        config = {'SEARCH_SNAPSHOT': os.path.join(directory, 'search.idx')}
+        first = create_app(config)
+        setup_db(first, self.database_path)
+        first.test_client().get('/categories')
+        self.assertTrue(os.path.exists(config['SEARCH_SNAPSHOT']))
+        second = create_app(config)
+        setup_db(second, self.database_path)
+        index = second.extensions['trivia_cache']['search_index']
+        self.assertTrue(index.restore())
+
+        def load():
+            raise AssertionError('restored index read the table')
+        index.load = load
+        self.assertEqual(index.search('dung'), (1, [23]))
+
+    def test_search_rebuilds_in_background(self):
+        index = self.app.extensions['trivia_cache']['search_index']
+        index.ttl = 0
+        with self.app.app_context():
+            self.assertEqual(index.search('dung'), (1, [23]))
+            # written by another process, so only a rebuild finds it
+            self.db.session.execute(
+                "INSERT INTO questions (question, answer, difficulty, "
+                "category) VALUES ('Zanzibar?', 'Yes', 1, 1)")
+            self.db.session.commit()
+        self.addCleanup(self.delete_zanzibar)
+        load, release = index.load, threading.Event()
+
+        def slow_load():
+            release.wait(5)
+            return load()
+        index.load = slow_load
+        started = time.time()
+        self.assertEqual(index.search('zanzibar'), (0, []))
+        self.assertLess(time.time() - started, 1)
+        release.set()
+        deadline = time.time() + 5
+        while index.search('zanzibar')[0] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(index.search('zanzibar')[0], 1)
+
+    def delete_zanzibar(self):
+        with self.app.app_context():
+            self.db.session.execute(
+                "DELETE FROM questions WHERE question = 'Zanzibar?'")
+            self.db.session.commit()
+
     def test_play_all(self):
         res = self.client().post('/play', json={})
         data = json.loads(res.data)
@@ -97,6 +246,119 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
 
+    def test_play_skips_previous_questions(self):
+        res = self.client().post('/play', json={
+            'quizCategory': 3, 'previousQuestions': [13, 14]})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], 15)
+
+    def test_play_category_exhausted(self):
+        res = self.client().post('/play', json={
+            'quizCategory': 3, 'previousQuestions': [13, 14, 15]})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question'], False)
+
+    def test_play_follows_writes(self):
+        client = self.client()
+        played = {'quizCategory': 3, 'previousQuestions': [13, 14, 15]}
+        client.post('/play', json=played)
+        res = client.post('/questions', json={
+            'question': 'Test question', 'answer': 'Test answer',
+            'difficult': 1, 'category': 3})
+        question_id = json.loads(res.data)['request']['id']
+        data = json.loads(client.post('/play', json=played).data)
+        self.assertEqual(data['question']['id'], question_id)
+        client.delete('/questions/{}'.format(question_id))
+        data = json.loads(client.post('/play', json=played).data)
+        self.assertEqual(data['question'], False)
+
+    def test_quiz_session(self):
+        client = self.client()
+        res = client.post('/quizzes', json={'quizCategory': 3})
+        quiz_id = json.loads(res.data)['quiz_id']
+        asked = set()
+        for turn in range(3):
+            res = client.post('/quizzes/{}/next'.format(quiz_id))
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            asked.add(data['question']['id'])
+            self.assertEqual(data['questions_asked'], turn + 1)
+        self.assertEqual(asked, {13, 14, 15})
+        data = json.loads(client.post('/quizzes/{}/next'.format(quiz_id)).data)
+        self.assertEqual(data['question'], False)
+        res = client.delete('/quizzes/{}'.format(quiz_id))
+        self.assertEqual(json.loads(res.data)['questions_asked'], 3)
+        res = client.post('/quizzes/{}/next'.format(quiz_id))
+        self.assertEqual(res.status_code, 404)
+
+    def test_quiz_deals_in_constant_time(self):
+        class CountingRandom(random.Random):
+            calls = 0
+
+            def randrange(self, *args):
+                CountingRandom.calls += 1
+                return super(CountingRandom, self).randrange(*args)
+
+        pool = QuestionPool(lambda: [(id, 1) for id in range(1000)], 300)
+        shuffle, seen, rnd = Shuffle(), Bitset(), CountingRandom(1)
+        for _ in range(1000):
+            seen.add(pool.deal(1, shuffle, seen, rnd))
+        # one pick per question, however few were left unseen
+        self.assertEqual(CountingRandom.calls, 1000)
+        self.assertEqual(len(seen), 1000)
+        self.assertIsNone(pool.deal(1, shuffle, seen, rnd))
+
+    def test_quiz_deal_survives_removals(self):
+        pool = QuestionPool(lambda: [(id, 1) for id in range(100)], 300)
+        shuffle, seen, rnd = Shuffle(), Bitset(), random.Random(2)
+        for _ in range(50):
+            seen.add(pool.deal(1, shuffle, seen, rnd))
+        # moves the last ids into slots that may already have been dealt
+        removed = [id for id in range(10) if id not in seen]
+        for id in removed:
+            pool.remove(id)
+        pool.add(100, 1)
+        dealt = []
+        while True:
+            id = pool.deal(1, shuffle, seen, rnd)
+            if id is None:
+                break
+            seen.add(id)
+            dealt.append(id)
+        self.assertEqual(len(dealt), len(set(dealt)))
+        self.assertEqual([id for id in range(101) if id not in seen],
+                         removed)
+
+    def test_quiz_session_invalid_category(self):
+        res = self.client().post('/quizzes', json={'quizCategory': 'x'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_quiz_session_out_of_range_category(self):
+        for category in (-5, 0, 2 ** 40, 1000, True):
+            res = self.client().post('/quizzes',
+                                     json={'quizCategory': category})
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 422)
+            self.assertEqual(data['success'], False)
+
+    def test_quiz_session_shared_store(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        config = {'QUIZ_STORE': 'filesystem', 'QUIZ_STORE_DIR': directory}
+        first, second = create_app(config), create_app(config)
+        setup_db(first, self.database_path)
+        setup_db(second, self.database_path)
+        res = first.test_client().post('/quizzes', json={'quizCategory': 3})
+        quiz_id = json.loads(res.data)['quiz_id']
+        res = second.test_client().post('/quizzes/{}/next'.format(quiz_id))
+        self.assertEqual(json.loads(res.data)['questions_asked'], 1)
+        res = first.test_client().delete('/quizzes/{}'.format(quiz_id))
+        self.assertEqual(json.loads(res.data)['questions_asked'], 1)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":